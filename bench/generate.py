@@ -0,0 +1,164 @@
+"""
+Synthetic database generator for benchmarks.
+
+Builds a fresh SQLite database with the given number of users and cats (plus
+colors, personalities, vaccinations, preferences, adoptions and messages)
+through multi-row Core inserts on a single connection. The output depends only
+on the sizes and the seed, so runs are comparable between releases.
+
+    python -m bench.generate bench.db --users 1000 --cats 100000
+"""
+import argparse
+import os
+import random
+from datetime import date, datetime, timedelta
+from time import perf_counter
+from sqlalchemy import create_engine, event, insert
+
+BENCH_PASSWORD = "bench-password"
+BATCH_SIZE = 10000
+
+COLORS = ["preto", "branco", "laranja", "cinza", "marrom", "creme", "tigrado", "tricolor", "siamês", "escaminha"]
+PERSONALITIES = ["tímido", "brincalhão", "carinhoso", "independente", "curioso", "calmo", "agitado", "sociável"]
+DISEASES = ["rinotraqueíte", "calicivirose", "panleucopenia", "clamidiose", "leucemia felina", "raiva"]
+WORDS = ["pelo", "longo", "curto", "olhos", "verdes", "azuis", "cauda", "manchas", "listras", "orelhas", "pequeno", "grande"]
+
+def _batched(rows):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def generate(path: str, users: int, cats: int, messages: int, seed: int = 42):
+    # Imported here so DATABASE_URL only has to be set for the API, not the generator.
+    from core import migrations, models, search, security, stats
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    rng = random.Random(seed)
+    engine = create_engine(f"sqlite:///{path}")
+
+    @event.listens_for(engine, "connect")
+    def _fast_pragmas(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+        dbapi_connection.execute("PRAGMA synchronous=OFF")
+
+    migrations.upgrade(engine)
+
+    # Every user shares one salt and password so generation does not run the KDF per row.
+    salt = security.gen_salt()
+    pass_hash = security.hash_password(salt, BENCH_PASSWORD)
+    today = date(2024, 9, 1)
+    now = datetime(2024, 9, 1, 12, 0, 0)
+
+    tables = {
+        models.Color: ({"id": i, "name": name} for i, name in enumerate(COLORS, 1)),
+        models.Personality: (
+            {"id": i, "name": name, "description": name} for i, name in enumerate(PERSONALITIES, 1)
+        ),
+        models.Disease: ({"id": i, "name": name, "description": None} for i, name in enumerate(DISEASES, 1)),
+        models.Vaccine: (
+            {"id": i, "name": f"vacina {name}", "description": None, "disease_id": i}
+            for i, name in enumerate(DISEASES, 1)
+        ),
+        # user1 is staff, so the benchmarks and audits also reach the staff-only endpoints.
+        models.User: (
+            {
+                "id": i, "name": f"Usuário {i}", "username": f"user{i}", "date_birth": date(1990, 1, 1),
+                "datetime_register": now - timedelta(days=rng.randrange(730)), "pass_salt": salt,
+                "pass_hash": pass_hash, "role": "admin" if i == 1 else "user", "contact_email": f"user{i}@example.com",
+                "contact_phone": "11999999999",
+            }
+            for i in range(1, users + 1)
+        ),
+        models.ColorPreference: (
+            {"user_id": user_id, "color_id": color_id}
+            for user_id in range(1, users + 1)
+            for color_id in rng.sample(range(1, len(COLORS) + 1), rng.randint(0, 3))
+        ),
+        models.PersonalityPreference: (
+            {"user_id": user_id, "personality_id": personality_id}
+            for user_id in range(1, users + 1)
+            for personality_id in rng.sample(range(1, len(PERSONALITIES) + 1), rng.randint(0, 2))
+        ),
+        models.Cat: (
+            {"id": i, "name": f"Gato {i}", "age": rng.randrange(20), "sex": rng.choice("MF")}
+            for i in range(1, cats + 1)
+        ),
+        models.CatColor: (
+            {"cat_id": cat_id, "color_id": color_id}
+            for cat_id in range(1, cats + 1)
+            for color_id in rng.sample(range(1, len(COLORS) + 1), rng.randint(1, 3))
+        ),
+        models.CatPersonality: (
+            {"cat_id": cat_id, "personality_id": personality_id}
+            for cat_id in range(1, cats + 1)
+            for personality_id in rng.sample(range(1, len(PERSONALITIES) + 1), rng.randint(1, 2))
+        ),
+        models.PhysicalDescription: (
+            {"cat_id": cat_id, "description": " ".join(rng.choices(WORDS, k=6))}
+            for cat_id in range(1, cats + 1)
+        ),
+        models.Vaccination: (
+            {
+                "cat_id": cat_id, "vaccine_id": vaccine_id, "dose": "1a",
+                "appl_date": today - timedelta(days=rng.randrange(365)),
+                "next_date": today + timedelta(days=rng.randrange(-60, 365)),
+            }
+            for cat_id in range(1, cats + 1)
+            for vaccine_id in rng.sample(range(1, len(DISEASES) + 1), rng.randint(0, 3))
+        ),
+        models.CatDisease: (
+            {"cat_id": cat_id, "disease_id": rng.randint(1, len(DISEASES))}
+            for cat_id in range(1, cats + 1) if rng.random() < 0.2
+        ),
+        models.Adoption: (
+            {
+                "user_id": rng.randint(1, users), "cat_id": cat_id,
+                "request_datetime": now - timedelta(days=rng.randrange(365)),
+                "hand_over_datetime": None, "status": rng.choice(["pendente", "concluída"]),
+            }
+            for cat_id in range(1, cats + 1) if users and rng.random() < 0.1
+        ),
+        models.Message: (
+            {
+                "sender_id": sender_id, "receiver_id": receiver_id,
+                "sent_datetime": now - timedelta(seconds=i), "content": " ".join(rng.choices(WORDS, k=8)),
+                "status": "sent",
+            }
+            for i in range(messages) if users > 1
+            for sender_id, receiver_id in [rng.sample(range(1, users + 1), 2)]
+        ),
+    }
+
+    counts = {}
+    with engine.begin() as conn:
+        for model, rows in tables.items():
+            counts[model.__tablename__] = 0
+            for batch in _batched(rows):
+                conn.execute(insert(model.__table__), batch)
+                counts[model.__tablename__] += len(batch)
+
+        counts[search.FTS_TABLE] = search.rebuild(conn)
+        counts[models.StatCounter.__tablename__] = stats.rebuild(conn)
+
+    engine.dispose()
+    return counts
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera um banco de dados sintético para benchmarks.")
+    parser.add_argument("path")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--cats", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    started = perf_counter()
+    counts = generate(args.path, args.users, args.cats, args.messages, args.seed)
+    print(counts, f"{perf_counter() - started:.2f}s")
@@ -0,0 +1,299 @@
+"""
+Query-plan audit of the API.
+
+Records each SQL statement the API issues, with the route that issued it, and
+runs EXPLAIN QUERY PLAN on one instance of every query shape (the statement
+with its IN lists collapsed). A plan fails the audit when it scans an audited
+table instead of searching it through an index, or sorts its rows in a
+temporary b-tree for ORDER BY (every matching row is read and sorted on each
+page). Problems listed in ALLOWED_SCANS are expected.
+
+The test suite runs the audit over every request its tests make (see
+tests/conftest.py) and fails the run on unexpected problems. This script runs
+it against a large synthetic database instead, calling every endpoint once;
+tables holding fewer than --min-rows rows are not audited:
+
+    python -m bench.query_plans --db plans.db --users 1000 --cats 10000 --output plans.json
+
+It exits with status 1 on any unexpected problem, so index regressions break
+the build instead of reaching production.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+from datetime import datetime, timezone
+from .generate import BENCH_PASSWORD, WORDS, generate
+from .run import _scenarios as _load_scenarios
+
+# Problem name for an ORDER BY sorted in a temporary b-tree.
+SORT = "ORDER BY"
+
+# (route, table or SORT) pairs whose problems are expected, with the reason.
+ALLOWED_SCANS = {
+    # Keyset pages walk the rowid in order and stop after `limit` rows.
+    ("GET /cats", "cats"): "first page reads the rowid in order up to the limit",
+    ("GET /cats/profiles", "cats"): "first page reads the rowid in order up to the limit",
+    ("GET /vaccinations/coverage", "cat_diseases"): "first page reads the primary key in order up to the limit",
+    # Exports stream every row in primary-key order.
+    ("GET /export/{table_name}", "cats"): "full dump",
+    ("GET /export/{table_name}", "adoptions"): "full dump",
+    ("GET /export/{table_name}", "rescues"): "full dump",
+    ("GET /vaccinations/coverage/export", "cat_diseases"): "full report",
+    ("GET /cats/search", SORT): "bm25 ranks every match; FTS5 cannot return them in rank order",
+    ("GET /messages/conversations", SORT): "one row per partner, from a window over the user's messages",
+    ("GET /messages/conversations/{user_id}", SORT): "merges two pages of at most `limit` rows",
+}
+
+# Reference and bookkeeping tables stay small whatever the catalog size; scanning them is fine.
+SMALL_TABLES = {"colors", "personalities", "diseases", "vaccines", "schema_migrations", "job_watermarks"}
+
+_STATEMENTS = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH")
+
+def _scenarios(users: int, cats: int):
+    """The load test's scenarios plus every other endpoint; writes first, so the reads find their rows."""
+    sequence = iter(range(1, sys.maxsize))
+    rescue = {
+        "description": "Gato preso no telhado", "addr_city": "Campinas", "addr_state": "São Paulo",
+        "addr_street": "Rua das Flores", "addr_number": 10, "addr_zipcode": "13010000",
+    }
+
+    return {
+        "POST /user": lambda rng, auth: ("POST", "/user", {"json": {
+            "name": "Auditoria", "username": f"audit{next(sequence)}", "date_birth": "2000-01-01",
+            "datetime_register": datetime.now().isoformat(), "role": "user", "contact_email": None,
+            "contact_phone": "11999999999", "password": BENCH_PASSWORD,
+        }}),
+        "POST /cat": lambda rng, auth: ("POST", "/cat", {"json": {"name": f"Auditoria {next(sequence)}", "age": 1, "sex": "F"}}),
+        "POST /cats/import": lambda rng, auth: ("POST", "/cats/import", {
+            "content": json.dumps({"name": f"Auditoria {next(sequence)}", "age": 2, "sex": "M", "colors": [1], "personalities": [1]}),
+        }),
+        "PUT /user/me/preferences": lambda rng, auth: ("PUT", "/user/me/preferences", {"headers": auth, "json": {
+            "colors": rng.sample(range(1, 11), 3), "personalities": rng.sample(range(1, 9), 2),
+        }}),
+        "POST /adoptions": lambda rng, auth: ("POST", "/adoptions", {"headers": auth, "json": {"cat_id": rng.randint(1, cats)}}),
+        "POST /rescues": lambda rng, auth: ("POST", "/rescues", {"headers": auth, "json": rescue}),
+        "POST /messages": lambda rng, auth: (
+            "POST", "/messages", {"headers": auth, "json": {"receiver_id": rng.randint(2, users), "content": "Olá"}},
+        ),
+        **_load_scenarios(users, cats),
+        "GET /colors": lambda rng, auth: ("GET", "/colors", {}),
+        "GET /users/batch": lambda rng, auth: ("GET", "/users/batch", {"params": {"ids": rng.sample(range(1, users + 1), 3)}}),
+        "GET /cats/batch": lambda rng, auth: ("GET", "/cats/batch", {"params": {"ids": rng.sample(range(1, cats + 1), 3)}}),
+        "GET /cats (first page)": lambda rng, auth: ("GET", "/cats?limit=50", {}),
+        "GET /cats?adopted": lambda rng, auth: ("GET", f"/cats?limit=50&cursor={rng.randint(0, cats)}&adopted=true", {}),
+        "GET /cats?age": lambda rng, auth: ("GET", f"/cats?limit=50&cursor={rng.randint(0, cats)}&min_age={rng.randint(0, 10)}&max_age=15", {}),
+        "GET /cats/profiles (first page)": lambda rng, auth: ("GET", "/cats/profiles?limit=50", {}),
+        "GET /cats/search": lambda rng, auth: ("GET", "/cats/search", {"params": {"q": rng.choice(WORDS)}}),
+        "GET /rescues/open": lambda rng, auth: ("GET", "/rescues/open?city=Campinas&state=São Paulo", {}),
+        "GET /rescues/open?zipcode_prefix": lambda rng, auth: ("GET", "/rescues/open?zipcode_prefix=1301", {}),
+        "GET /rescues/open/counts": lambda rng, auth: ("GET", "/rescues/open/counts", {}),
+        "GET /stats": lambda rng, auth: ("GET", "/stats", {"headers": auth}),
+        "GET /vaccinations/coverage": lambda rng, auth: ("GET", "/vaccinations/coverage", {"headers": auth}),
+        "GET /messages/conversations": lambda rng, auth: ("GET", "/messages/conversations", {"headers": auth}),
+        "GET /messages/conversations/{user_id}": lambda rng, auth: (
+            "GET", f"/messages/conversations/{rng.randint(2, users)}", {"headers": auth},
+        ),
+    }
+
+# PLANS ===========================================================================================
+
+def _shape(statement: str):
+    statement = " ".join(statement.split())
+    return re.sub(r"\(\?(?:, \?)+\)", "(?, ...)", statement)
+
+def _aliases(statement: str):
+    """Alias -> table for every `table AS alias` in the statement; plans name tables by alias."""
+    return {alias: table for table, alias in re.findall(r"(\w+) AS (\w+)", statement.replace('"', ""))}
+
+def _problems(plan: list[str], statement: str, tables: set[str]):
+    """The audited tables the plan scans, plus SORT when it sorts the rows for ORDER BY."""
+    aliases = _aliases(statement)
+    problems = []
+    for detail in plan:
+        if detail == "USE TEMP B-TREE FOR ORDER BY":
+            problem = SORT
+        elif (match := re.match(r"SCAN (?:TABLE )?(\w+)", detail)) and "VIRTUAL TABLE" not in detail:
+            problem = aliases.get(match.group(1), match.group(1))
+            if problem not in tables:
+                continue
+        else:
+            continue
+        if problem not in problems:
+            problems.append(problem)
+    return problems
+
+def audit(conn, recorded: dict, tables: set[str]):
+    """Plans every recorded shape; returns the report entries and the number of failed shapes."""
+    queries = []
+    failures = 0
+
+    for shape, (statement, parameters, endpoints) in recorded.items():
+        plan = [row[3] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)]
+        problems = _problems(plan, statement, tables)
+        unexpected = [
+            problem for problem in problems
+            if not all((endpoint, problem) in ALLOWED_SCANS for endpoint in endpoints)
+        ]
+        failures += bool(unexpected)
+        queries.append({
+            "statement": shape,
+            "endpoints": sorted(endpoints),
+            "plan": plan,
+            "problems": problems,
+            "failed": bool(unexpected),
+        })
+
+    queries.sort(key=lambda query: (not query["failed"], query["endpoints"], query["statement"]))
+    return queries, failures
+
+def describe_failure(query: dict):
+    problems = ", ".join(
+        "ordenação em árvore temporária" if problem == SORT else f"varredura completa de {problem}"
+        for problem in query["problems"]
+    )
+    return f"{problems.capitalize()} em {', '.join(query['endpoints'])}: {query['statement']}"
+
+# RECORDING =======================================================================================
+
+class Recorder:
+    """
+    Records, per query shape, one instance of the statements issued while
+    `endpoint` is set: shape -> (statement, parameters, endpoints).
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.recorded = {}
+        self.endpoint = None
+
+    def route(self, method: str, path: str):
+        """The route template serving the request, e.g. "GET /cats/{id}"."""
+        from starlette.routing import Match
+
+        scope = {"type": "http", "method": method, "path": path, "root_path": ""}
+        for route in self.app.routes:
+            if route.matches(scope)[0] == Match.FULL:
+                return f"{method} {route.path}"
+        return f"{method} {path}"
+
+    def before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if self.endpoint is None or not statement.lstrip().upper().startswith(_STATEMENTS):
+            return
+        shape = _shape(statement)
+        if shape not in self.recorded:
+            # A multi-row INSERT batched by SQLAlchemy ("insertmanyvalues") arrives as
+            # executemany with one flat parameter list.
+            if executemany and parameters and isinstance(parameters[0], (list, tuple, dict)):
+                parameters = parameters[0]
+            self.recorded[shape] = (statement, parameters, set())
+        self.recorded[shape][2].add(self.endpoint)
+
+    def listen(self, engines):
+        from sqlalchemy import event
+
+        for engine in engines:
+            event.listen(engine, "before_cursor_execute", self.before_cursor_execute)
+
+    def remove(self, engines):
+        from sqlalchemy import event
+
+        for engine in engines:
+            event.remove(engine, "before_cursor_execute", self.before_cursor_execute)
+
+# DRIVER ==========================================================================================
+
+async def record(users: int, cats: int, only: list[str] | None, seed: int):
+    """Calls each endpoint once; returns shape -> (statement, parameters, endpoints)."""
+    import httpx
+    from core.database import async_engine, async_read_engine
+    from core.main import app
+
+    recorder = Recorder(app)
+
+    # Startup (schema check, match index load) is left out: only request handling is audited.
+    async with app.router.lifespan_context(app):
+        recorder.listen({async_engine.sync_engine, async_read_engine.sync_engine})
+
+        rng = random.Random(seed)
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://audit") as client:
+            login = await client.post("/auth", data={"username": "user1", "password": BENCH_PASSWORD})
+            auth = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+            for name, build in _scenarios(users, cats).items():
+                if only and name not in only:
+                    continue
+                method, url, kwargs = build(rng, auth)
+                recorder.endpoint = recorder.route(method, httpx.URL(url).path)
+                response = await client.request(method, url, **kwargs)
+                recorder.endpoint = None
+                if response.status_code >= 500:
+                    raise RuntimeError(f"{name} returned {response.status_code}")
+
+    return recorder.recorded
+
+def main():
+    parser = argparse.ArgumentParser(description="Auditoria dos planos de consulta da API.")
+    parser.add_argument("--db", default="plans.db")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--cats", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--min-rows", type=int, default=1000, help="smaller tables may be scanned")
+    parser.add_argument("--endpoint", action="append", help="only call these endpoints (repeatable)")
+    parser.add_argument("--reuse-db", action="store_true", help="skip generation if --db exists")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    # Must be set before anything imports core.database.
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    os.environ.setdefault("JWT_KEY", "bench")
+    os.environ.setdefault("VACCINATION_REMINDER_INTERVAL_IN_SECONDS", "0")
+
+    if not (args.reuse_db and os.path.exists(args.db)):
+        generate(args.db, args.users, args.cats, args.messages, args.seed)
+
+    recorded = asyncio.run(record(args.users, args.cats, args.endpoint, args.seed))
+
+    from sqlalchemy import func, inspect, select, table
+    from core.database import engine
+
+    with engine.connect() as conn:
+        sizes = {
+            name: conn.scalar(select(func.count()).select_from(table(name)))
+            for name in inspect(conn).get_table_names()
+        }
+        queries, failures = audit(conn, recorded, {name for name, size in sizes.items() if size >= args.min_rows})
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "sqlite": engine.dialect.dbapi.sqlite_version,
+            "users": args.users,
+            "cats": args.cats,
+            "min_rows": args.min_rows,
+            "queries": len(queries),
+            "failures": failures,
+        },
+        "tables": sizes,
+        "queries": queries,
+    }
+    output = json.dumps(report, indent=2, ensure_ascii=False)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+    for query in queries:
+        if query["failed"]:
+            print(describe_failure(query), file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
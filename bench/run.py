@@ -0,0 +1,147 @@
+"""
+Load test of the API against a synthetic database.
+
+Drives each endpoint with an in-process ASGI client at a fixed concurrency and
+prints (or writes) per-endpoint p50/p95/p99 latency and requests per second as
+JSON, so results can be diffed between releases.
+
+    python -m bench.run --db bench.db --users 1000 --cats 10000 --concurrency 32 --output results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+from datetime import datetime, timezone
+from statistics import mean, quantiles
+from time import perf_counter
+from .generate import BENCH_PASSWORD, generate
+
+def _scenarios(users: int, cats: int):
+    """Endpoint name -> function building (method, url, kwargs) from an rng and an auth header."""
+    return {
+        "POST /auth": lambda rng, auth: (
+            "POST", "/auth", {"data": {"username": f"user{rng.randint(1, users)}", "password": BENCH_PASSWORD}},
+        ),
+        "GET /user": lambda rng, auth: ("GET", f"/user?id={rng.randint(1, users)}", {}),
+        "GET /user/me/": lambda rng, auth: ("GET", "/user/me/", {"headers": auth}),
+        "GET /cat": lambda rng, auth: ("GET", f"/cat?id={rng.randint(1, cats)}", {}),
+        "GET /cat/profile": lambda rng, auth: ("GET", f"/cat/profile?id={rng.randint(1, cats)}", {}),
+        "GET /cats": lambda rng, auth: (
+            "GET", f"/cats?limit=50&cursor={rng.randint(0, cats)}&sex={rng.choice('MF')}", {},
+        ),
+        "GET /cats?color_id": lambda rng, auth: (
+            "GET", f"/cats?limit=50&cursor={rng.randint(0, cats)}&color_id={rng.randint(1, 10)}", {},
+        ),
+        "GET /cats/profiles": lambda rng, auth: ("GET", f"/cats/profiles?limit=50&cursor={rng.randint(0, cats)}", {}),
+        "GET /match": lambda rng, auth: ("GET", "/match?k=20", {"headers": auth}),
+        "GET /messages/inbox": lambda rng, auth: ("GET", "/messages/inbox?limit=50", {"headers": auth}),
+    }
+
+def _summary(latencies: list[float], errors: int, elapsed: float):
+    if len(latencies) < 2:
+        return {"requests": len(latencies), "errors": errors}
+
+    cuts = quantiles(latencies, n=100)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 1),
+        "mean_ms": round(mean(latencies) * 1000, 3),
+        "p50_ms": round(cuts[49] * 1000, 3),
+        "p95_ms": round(cuts[94] * 1000, 3),
+        "p99_ms": round(cuts[98] * 1000, 3),
+    }
+
+async def _drive(client, build, requests: int, concurrency: int, auth: dict, seed: int):
+    rng = random.Random(seed)
+    latencies = []
+    errors = 0
+    remaining = requests
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            method, url, kwargs = build(rng, auth)
+            started = perf_counter()
+            response = await client.request(method, url, **kwargs)
+            latencies.append(perf_counter() - started)
+            if response.status_code >= 400 and response.status_code != 404:
+                errors += 1
+
+    started = perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return _summary(latencies, errors, perf_counter() - started)
+
+async def run(users: int, cats: int, requests: int, concurrency: int, only: list[str] | None, seed: int):
+    import httpx
+    from core.main import app
+
+    results = {}
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            login = await client.post("/auth", data={"username": "user1", "password": BENCH_PASSWORD})
+            auth = {"Authorization": f"Bearer {login.json()['access_token']}"}
+
+            for name, build in _scenarios(users, cats).items():
+                if only and name not in only:
+                    continue
+                # Logins are deliberately slow (KDF), so they get a tenth of the requests.
+                count = max(requests // 10, concurrency) if name == "POST /auth" else requests
+                results[name] = await _drive(client, build, count, concurrency, auth, seed)
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark da API com um banco de dados sintético.")
+    parser.add_argument("--db", default="bench.db")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--cats", type=int, default=10000)
+    parser.add_argument("--messages", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--endpoint", action="append", help="only run these endpoints (repeatable)")
+    parser.add_argument("--reuse-db", action="store_true", help="skip generation if --db exists")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    args = parser.parse_args()
+
+    # Must be set before anything imports core.database.
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.abspath(args.db)}"
+    os.environ.setdefault("JWT_KEY", "bench")
+    os.environ.setdefault("VACCINATION_REMINDER_INTERVAL_IN_SECONDS", "0")
+
+    generation = None
+    if not (args.reuse_db and os.path.exists(args.db)):
+        started = perf_counter()
+        generate(args.db, args.users, args.cats, args.messages, args.seed)
+        generation = round(perf_counter() - started, 2)
+
+    endpoints = asyncio.run(run(args.users, args.cats, args.requests, args.concurrency, args.endpoint, args.seed))
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "users": args.users,
+            "cats": args.cats,
+            "messages": args.messages,
+            "requests_per_endpoint": args.requests,
+            "concurrency": args.concurrency,
+            "generation_seconds": generation,
+        },
+        "endpoints": endpoints,
+    }
+    output = json.dumps(report, indent=2)
+
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Microbenchmark of response serialization.
+
+Compares, for a page of 1, 100 and 10k cats, FastAPI's `response_model` path
+(validate the ORM rows, dump them, encode with the standard JSON encoder) with
+`core.serialization.page_response`. Rows are transient ORM objects, so no
+database is involved.
+
+    python -m bench.serialization --repeat 20
+"""
+import argparse
+import asyncio
+import json
+import os
+from time import perf_counter
+
+SIZES = (1, 100, 10000)
+
+def _cats(count: int):
+    from core import models
+    return [models.Cat(id=i, name=f"Gato {i}", age=i % 20, sex="MF"[i % 2]) for i in range(1, count + 1)]
+
+def _response_model_path():
+    from fastapi.responses import JSONResponse
+    from fastapi.routing import serialize_response
+    from fastapi.utils import create_response_field
+    from core import schemas
+
+    field = create_response_field(name="response", type_=schemas.CatPage)
+
+    async def render(cats):
+        content = await serialize_response(field=field, response_content={"items": cats, "next_cursor": None})
+        return JSONResponse(content).body
+
+    return render
+
+def _fast_path():
+    from core import schemas, serialization
+
+    async def render(cats):
+        page = schemas.CatPage.model_construct(items=cats, next_cursor=None)
+        return serialization.page_response(schemas.Cat, page).body
+
+    return render
+
+async def _time(render, cats, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        started = perf_counter()
+        body = await render(cats)
+        best = min(best, perf_counter() - started)
+    return best, body
+
+async def run(repeat: int):
+    paths = {"response_model": _response_model_path(), "fast": _fast_path()}
+    results = {}
+
+    for size in SIZES:
+        cats = _cats(size)
+        timings = {}
+        bodies = {}
+        for name, render in paths.items():
+            timings[name], bodies[name] = await _time(render, cats, repeat)
+
+        # Both paths must produce the same document.
+        assert json.loads(bodies["response_model"]) == json.loads(bodies["fast"])
+
+        results[size] = {
+            **{f"{name}_ms": round(seconds * 1000, 4) for name, seconds in timings.items()},
+            "speedup": round(timings["response_model"] / timings["fast"], 1),
+        }
+
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark da serialização de respostas.")
+    parser.add_argument("--repeat", type=int, default=20, help="best of N runs per size")
+    args = parser.parse_args()
+
+    # Importing core opens (and may create) the configured database; keep it out of the way.
+    os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+    print(json.dumps(asyncio.run(run(args.repeat)), indent=2))
+
+if __name__ == "__main__":
+    main()
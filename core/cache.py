@@ -0,0 +1,186 @@
+import logging
+from collections import OrderedDict
+from hashlib import sha256
+from os import getenv
+from threading import Lock
+from time import time
+from pydantic import TypeAdapter
+from sqlalchemy import event, inspect, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from . import models, schemas
+
+USER_CACHE_MAX_SIZE = int(getenv("USER_CACHE_MAX_SIZE", "10000"))
+USER_CACHE_TTL_IN_SECONDS = int(getenv("USER_CACHE_TTL_IN_SECONDS", "300"))
+REFERENCE_CACHE_TTL_IN_SECONDS = int(getenv("REFERENCE_CACHE_TTL_IN_SECONDS", "60"))
+
+logger = logging.getLogger(__name__)
+
+class TTLCache:
+    """
+    Bounded LRU cache whose entries also expire after `ttl` seconds, or earlier
+    at an explicit `expires_at` timestamp. Keeps hit/miss counters.
+    """
+
+    def __init__(self, max_size: int, ttl: float):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.lock = Lock()
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+
+            if entry is None or entry[0] <= time():
+                if entry is not None:
+                    del self.entries[key]
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, expires_at: float | None = None):
+        expiration = time() + self.ttl
+        if expires_at is not None:
+            expiration = min(expiration, expires_at)
+
+        with self.lock:
+            self.entries[key] = (expiration, value)
+            self.entries.move_to_end(key)
+
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def invalidate(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        return {"size": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+
+class ReferenceCache:
+    """
+    Lookup tables kept as ready-to-send JSON bodies with a strong ETag.
+
+    Tables are loaded at startup and dropped whenever a commit in this process
+    touches them; the next read reloads and re-serializes. Each worker process
+    keeps its own copy, and changes it cannot see (other workers, scripts, SQL)
+    are picked up by reloading each table once its copy is `ttl` seconds old.
+    The ETag is a hash of the body, so a reload that finds nothing new keeps it.
+    """
+
+    TABLES = {
+        "colors": (models.Color, schemas.Color),
+        "personalities": (models.Personality, schemas.Personality),
+        "diseases": (models.Disease, schemas.Disease),
+        "vaccines": (models.Vaccine, schemas.Vaccine),
+    }
+
+    def __init__(self, ttl: float = REFERENCE_CACHE_TTL_IN_SECONDS):
+        self.ttl = ttl
+        # name -> (expiration, etag, body)
+        self.entries = {}
+        self.adapters = {name: TypeAdapter(list[schema]) for name, (_, schema) in self.TABLES.items()}
+
+    async def load(self, db: AsyncSession, name: str):
+        model, _ = self.TABLES[name]
+        rows = (await db.scalars(select(model).order_by(model.id))).all()
+        body = self.adapters[name].dump_json(rows)
+        etag = f'"{sha256(body).hexdigest()}"'
+
+        self.entries[name] = (time() + self.ttl, etag, body)
+        return etag, body
+
+    async def load_all(self, db: AsyncSession):
+        for name in self.TABLES:
+            await self.load(db, name)
+
+    async def get(self, db: AsyncSession, name: str):
+        """Returns `(etag, body)` for the table, reloading it if it was invalidated or expired."""
+        entry = self.entries.get(name)
+        if entry is None or entry[0] <= time():
+            return await self.load(db, name)
+        return entry[1:]
+
+    def invalidate(self, names):
+        for name in names:
+            self.entries.pop(name, None)
+
+class ChangeSignal:
+    """
+    In-process notification for changes made with Core statements, which the
+    ORM events below never see. Senders call `send` after committing; each
+    subscriber is called in turn, and one that fails does not stop the others.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.subscribers = []
+
+    def subscribe(self, callback):
+        self.subscribers.append(callback)
+        return callback
+
+    def send(self, *args):
+        for callback in self.subscribers:
+            try:
+                callback(*args)
+            except Exception:
+                logger.exception("%s subscriber %r failed", self.name, callback)
+
+def etag_matches(if_none_match: str | None, etag: str):
+    if not if_none_match:
+        return False
+
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or etag in candidates
+
+
+# Authenticated users by token subject (username).
+user_cache = TTLCache(USER_CACHE_MAX_SIZE, USER_CACHE_TTL_IN_SECONDS)
+
+reference_cache = ReferenceCache()
+
+# Sent as (user_id, changes) after a user's preferences are replaced; `changes`
+# are ("color_preference" | "personality_preference", user_id, id, added) tuples.
+preferences_changed = ChangeSignal("preferences_changed")
+
+# ORM SYNCHRONIZATION =============================================================================
+
+_REFERENCE_TABLE_NAMES = {model: name for name, (model, _) in ReferenceCache.TABLES.items()}
+
+@event.listens_for(Session, "after_flush")
+def _collect_stale_entries(session: Session, flush_context):
+    usernames = session.info.setdefault("stale_usernames", set())
+    tables = session.info.setdefault("stale_reference_tables", set())
+
+    for obj in (*session.dirty, *session.deleted):
+        if isinstance(obj, models.User):
+            usernames.add(obj.username)
+            usernames.update(inspect(obj).attrs.username.history.deleted)
+
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        name = _REFERENCE_TABLE_NAMES.get(type(obj))
+        if name is not None:
+            tables.add(name)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_entries(session: Session):
+    for username in session.info.pop("stale_usernames", ()):
+        user_cache.invalidate(username)
+    reference_cache.invalidate(session.info.pop("stale_reference_tables", ()))
+
+@event.listens_for(Session, "after_rollback")
+def _discard_stale_entries(session: Session):
+    session.info.pop("stale_usernames", None)
+    session.info.pop("stale_reference_tables", None)
@@ -1,7 +1,43 @@
 import jwt
-from datetime import datetime, timedelta, timezone
-from sqlalchemy.orm import Session
-from . import models, schemas, security
+import logging
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import DateTime, case, delete, func, insert, literal, null, or_, select, true, tuple_, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased, joinedload, selectinload
+from . import matching, messaging, models, rescues, schemas, search, security, stats
+from .cache import preferences_changed
+from .writer import group_writer
+
+logger = logging.getLogger(__name__)
+
+class InvalidCursorError(ValueError):
+    """A pagination cursor that was not produced by this API."""
+
+# Ids are signed 64-bit integers in the database; larger ones overflow the driver.
+MAX_CURSOR_ID = 2**63 - 1
+
+def _parse_cursor_id(value: str, cursor: str):
+    id = int(value)
+    if not 0 <= id <= MAX_CURSOR_ID:
+        raise InvalidCursorError(cursor)
+    return id
+
+def _parse_datetime_cursor(cursor: str):
+    """Splits an `<isoformat>_<id>` keyset cursor."""
+    try:
+        value, id = cursor.rsplit("_", 1)
+        return datetime.fromisoformat(value), _parse_cursor_id(id, cursor)
+    except ValueError:
+        raise InvalidCursorError(cursor) from None
+
+def _parse_pair_cursor(cursor: str):
+    """Splits an `<id>_<id>` keyset cursor."""
+    try:
+        first, second = cursor.split("_")
+        return _parse_cursor_id(first, cursor), _parse_cursor_id(second, cursor)
+    except ValueError:
+        raise InvalidCursorError(cursor) from None
 
 # AUTHENTICATION
 
@@ -18,71 +54,604 @@ def create_auth_token(data: dict, expiration_delta: timedelta):
 
     return encoded_jwt
 
-def authenticate_user(username: str, password: str, db: Session):
-    user = get_user_by_username(db, username)
+async def authenticate_user(username: str, password: str, db: AsyncSession):
+    user = await get_user_by_username(db, username)
 
     if user is None:
+        return await security.check_dummy_password_async(password)
+    elif not await security.check_password_async(user.pass_salt, user.pass_hash, password):
         return False
-    elif not security.check_password(user.pass_salt, user.pass_hash, password):
-        return False
+
+    # Transparently upgrade legacy SHA-256 hashes and hashes made with an older KDF cost.
+    if security.needs_rehash(user.pass_hash):
+        user.pass_salt = security.gen_salt()
+        user.pass_hash = await security.hash_password_async(user.pass_salt, password)
+        await db.commit()
     
     return user
 
 # USER ============================================================================================
 
-def get_user_by_id(db: Session, id: int):
-    user = db.query(models.User).filter(models.User.id == id).first()
-    print(user)
+async def get_user_by_id(db: AsyncSession, id: int):
+    user = await db.scalar(select(models.User).where(models.User.id == id))
+    logger.debug("%r", user)
     return user
 
-def get_user_by_username(db: Session, username: str):
-    user = db.query(models.User).filter(models.User.username == username).first()
-    print(user)
+async def _get_by_ids(db: AsyncSession, model, ids: list[int]):
+    """
+    Loads rows by primary key with one IN query. Returns them in request order
+    (duplicates collapsed) along with the ids that were not found.
+    """
+    ids = list(dict.fromkeys(ids))
+    rows = {row.id: row for row in await db.scalars(select(model).where(model.id.in_(ids)))}
+
+    return [rows[id] for id in ids if id in rows], [id for id in ids if id not in rows]
+
+async def get_users_by_ids(db: AsyncSession, ids: list[int]):
+    users, missing = await _get_by_ids(db, models.User, ids)
+    return schemas.UserBatch.model_construct(items=users, missing=missing)
+
+async def get_user_by_username(db: AsyncSession, username: str):
+    user = await db.scalar(select(models.User).where(models.User.username == username))
+    logger.debug("%r", user)
     return user
 
-def create_user(db: Session, user: schemas.UserCreate):
+async def _insert(db: AsyncSession, model, values: dict):
+    """
+    Inserts one row and commits, through the group-commit writer when it runs.
+    Unique constraints reject duplicates: callers handle IntegrityError.
+    """
+    if group_writer.running:
+        row = await group_writer.insert(model, values)
+    else:
+        row = model(**values)
+        db.add(row)
+        await db.commit()
+
+    logger.debug("%r", row)
+    return row
+
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
     salt = security.gen_salt()
-    db_user = models.User(
+    return await _insert(db, models.User, dict(
         name = user.name,
         username = user.username,
         date_birth = user.date_birth,
         datetime_register = user.datetime_register,
         pass_salt = salt,
-        pass_hash = security.hash_password(salt, user.password),
+        pass_hash = await security.hash_password_async(salt, user.password),
         role = user.role,
         contact_email = user.contact_email,
         contact_phone = user.contact_phone,
-    )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-    print(db_user)
+    ))
+
+_PREFERENCE_KINDS = (
+    ("color_preference", models.ColorPreference, models.ColorPreference.color_id, models.Color),
+    ("personality_preference", models.PersonalityPreference, models.PersonalityPreference.personality_id, models.Personality),
+)
+
+async def _replace_preference_rows(db: AsyncSession, model, column, user_id: int, wanted: set[int]):
+    """
+    Makes the user's rows of one preference kind exactly `wanted`; returns the
+    (removed, added) ids, taken from the rows the statements actually touched.
+    """
+    table = model.__table__
+    column = table.c[column.key]
+    belongs = table.c.user_id == user_id
+
+    if (await db.connection()).dialect.name == "mysql":
+        # No RETURNING on MySQL: lock the user's rows first, so concurrent replaces queue behind this one.
+        current = set(await db.scalars(select(column).where(belongs).with_for_update()))
+        removed, added = current - wanted, wanted - current
+        if removed:
+            await db.execute(delete(table).where(belongs, column.in_(removed)))
+        if added:
+            await db.execute(insert(table).values([{"user_id": user_id, column.key: id} for id in added]))
+        return removed, added
+
+    removed = set(await db.scalars(delete(table).where(belongs, column.not_in(wanted)).returning(column)))
+    added = set()
+    if wanted:
+        statement = sqlite_insert(table).values([{"user_id": user_id, column.key: id} for id in wanted])
+        added = set(await db.scalars(statement.on_conflict_do_nothing().returning(column)))
+    return removed, added
+
+async def replace_preferences(db: AsyncSession, user_id: int, preferences: schemas.Preferences):
+    """
+    Replaces the user's color and personality preferences with the given sets.
+    Per kind, one DELETE of the ids no longer wanted and one multi-row INSERT
+    that skips the ids already there, in a single transaction; the change
+    notification is built from the rows they touched, so concurrent replaces
+    cannot report (or leave) a mix of both. Returns None, writing nothing, when
+    an id does not exist.
+    """
+    kinds = list(zip(_PREFERENCE_KINDS, (set(preferences.colors), set(preferences.personalities))))
+    for (kind, model, column, reference), wanted in kinds:
+        if wanted and await db.scalar(select(func.count()).where(reference.id.in_(wanted))) != len(wanted):
+            return None
 
-    return db_user
+    changes = []
+    for (kind, model, column, reference), wanted in kinds:
+        removed, added = await _replace_preference_rows(db, model, column, user_id, wanted)
+        changes += [(kind, user_id, id, False) for id in removed] + [(kind, user_id, id, True) for id in added]
+    await db.commit()
+
+    # Core writes bypass the flush events, so subscribers (the match index) are told explicitly.
+    if changes:
+        preferences_changed.send(user_id, changes)
+
+    return schemas.Preferences(colors=sorted(set(preferences.colors)), personalities=sorted(set(preferences.personalities)))
 
 # CAT =============================================================================================
 
-def get_cat_by_id(db: Session, id: int):
-    cat = db.query(models.Cat).filter(models.Cat.id == id).first()
-    print(cat)
+async def get_cat_by_id(db: AsyncSession, id: int):
+    cat = await db.scalar(select(models.Cat).where(models.Cat.id == id))
+    logger.debug("%r", cat)
 
     return cat
 
-def get_cat_by_name(db: Session, name: str):
-    cat = db.query(models.Cat).filter(models.Cat.name == name).first()
-    print(cat)
+async def get_cats_by_ids(db: AsyncSession, ids: list[int]):
+    cats, missing = await _get_by_ids(db, models.Cat, ids)
+    return schemas.CatBatch.model_construct(items=cats, missing=missing)
+
+async def get_cat_by_name(db: AsyncSession, name: str):
+    cat = await db.scalar(select(models.Cat).where(models.Cat.name == name))
+    logger.debug("%r", cat)
     
     return cat
 
-def create_cat(db: Session, cat: schemas.CatCreate):
-    db_cat = models.Cat (
+def _cat_listing_query(cursor: int | None, filters: schemas.CatFilters):
+    query = select(models.Cat)
+
+    # The page is ordered by the cat id of the most selective index available, so
+    # SQLite can seek straight to the cursor and stop after `limit` rows.
+    key = models.Cat.id
+    if filters.color_id is not None:
+        query = query.join(models.CatColor).where(models.CatColor.color_id == filters.color_id)
+        key = models.CatColor.cat_id
+    if filters.personality_id is not None:
+        query = query.join(models.CatPersonality).where(
+            models.CatPersonality.personality_id == filters.personality_id
+        )
+        if key is models.Cat.id:
+            key = models.CatPersonality.cat_id
+
+    # Keyset pagination: seek past the last id of the previous page instead of OFFSET.
+    if cursor is not None:
+        query = query.where(key > cursor)
+    if filters.sex is not None:
+        query = query.where(models.Cat.sex == filters.sex)
+    if filters.min_age is not None and filters.min_age == filters.max_age:
+        # ix_cats_age_id is ordered by id within a single age, so the seek still works.
+        query = query.where(models.Cat.age == filters.min_age)
+    else:
+        # Across an age range the index would read and sort every cat in the range on
+        # each page; `age + 0` keeps the planner on the id order, so LIMIT ends the scan.
+        age = models.Cat.age + 0
+        if filters.min_age is not None:
+            query = query.where(age >= filters.min_age)
+        if filters.max_age is not None:
+            query = query.where(age <= filters.max_age)
+    if filters.adopted is not None:
+        has_adoption = select(models.Adoption.cat_id).where(
+            models.Adoption.cat_id == models.Cat.id, models.Adoption.status.in_(models.ADOPTION_ACTIVE_STATUSES),
+        ).exists()
+        query = query.where(has_adoption if filters.adopted else ~has_adoption)
+
+    return query, key
+
+async def get_cats(db: AsyncSession, limit: int, cursor: int | None, filters: schemas.CatFilters):
+    query, key = _cat_listing_query(cursor, filters)
+    cats = (await db.scalars(query.order_by(key).limit(limit + 1))).all()
+    next_cursor = cats[limit - 1].id if len(cats) > limit else None
+
+    # Built without validation: rows are trusted and serialized by `serialization.page_response`.
+    return schemas.CatPage.model_construct(items=cats[:limit], next_cursor=next_cursor)
+
+# Loads the whole profile graph in a fixed number of queries (the cats themselves
+# joined to their one-to-one rows, plus one SELECT ... IN per collection),
+# however many cats are on the page.
+CAT_PROFILE_OPTIONS = (
+    joinedload(models.Cat.physical_description),
+    joinedload(models.Cat.active_adoption),
+    selectinload(models.Cat.cat_colors).joinedload(models.CatColor.color),
+    selectinload(models.Cat.cat_personalities).joinedload(models.CatPersonality.personality),
+    selectinload(models.Cat.cat_diseases).joinedload(models.CatDisease.disease),
+    selectinload(models.Cat.vaccinations).joinedload(models.Vaccination.vaccine),
+)
+
+def _cat_profile(cat: models.Cat):
+    return schemas.CatProfile(
+        id=cat.id,
+        name=cat.name,
+        age=cat.age,
+        sex=cat.sex,
+        colors=sorted((cat_color.color for cat_color in cat.cat_colors), key=lambda color: color.id),
+        personalities=sorted(
+            (cat_personality.personality for cat_personality in cat.cat_personalities),
+            key=lambda personality: personality.id,
+        ),
+        diseases=sorted((cat_disease.disease for cat_disease in cat.cat_diseases), key=lambda disease: disease.id),
+        vaccinations=sorted(cat.vaccinations, key=lambda vaccination: vaccination.vaccine_id),
+        physical_description=cat.physical_description.description if cat.physical_description else None,
+        adoption=cat.active_adoption,
+    )
+
+async def get_cat_profile_by_id(db: AsyncSession, id: int):
+    cat = await db.scalar(select(models.Cat).where(models.Cat.id == id).options(*CAT_PROFILE_OPTIONS))
+
+    return _cat_profile(cat) if cat else None
+
+async def get_cat_profiles(db: AsyncSession, limit: int, cursor: int | None, filters: schemas.CatFilters):
+    query, key = _cat_listing_query(cursor, filters)
+    cats = (await db.scalars(query.order_by(key).limit(limit + 1).options(*CAT_PROFILE_OPTIONS))).unique().all()
+    next_cursor = cats[limit - 1].id if len(cats) > limit else None
+
+    return schemas.CatProfilePage(items=[_cat_profile(cat) for cat in cats[:limit]], next_cursor=next_cursor)
+
+async def search_cats(db: AsyncSession, q: str, limit: int, offset: int):
+    dialect = (await db.connection()).dialect.name
+    match = search.match_expression(q, dialect)
+    if not match:
+        return schemas.CatSearchPage(items=[], next_offset=None)
+
+    ranking = (await db.execute(
+        search.search_query(dialect), {"match": match, "limit": limit + 1, "offset": offset}
+    )).all()
+    next_offset = offset + limit if len(ranking) > limit else None
+    ranking = ranking[:limit]
+
+    cat_ids = [cat_id for cat_id, _ in ranking]
+    cats = {cat.id: cat for cat in await db.scalars(select(models.Cat).where(models.Cat.id.in_(cat_ids)))}
+
+    return schemas.CatSearchPage(
+        items=[
+            schemas.CatSearchResult(id=cat.id, name=cat.name, age=cat.age, sex=cat.sex, rank=rank)
+            for cat_id, rank in ranking
+            if (cat := cats.get(cat_id)) is not None
+        ],
+        next_offset=next_offset,
+    )
+
+async def create_cat(db: AsyncSession, cat: schemas.CatCreate):
+    return await _insert(db, models.Cat, dict(
         name = cat.name,
         age = cat.age,
         sex = cat.sex,
+    ))
+
+# ADOPTION ========================================================================================
+
+async def create_adoption(db: AsyncSession, user_id: int, cat_id: int):
+    """
+    Requests the adoption of a cat in one INSERT ... SELECT ... RETURNING, which
+    inserts nothing (and returns None) when the cat does not exist. A second
+    active adoption of the same cat raises IntegrityError.
+    """
+    statement = insert(models.Adoption).from_select(
+        ["user_id", "cat_id", "request_datetime", "hand_over_datetime", "status"],
+        select(
+            literal(user_id), models.Cat.id, literal(datetime.now(), DateTime), null(),
+            literal(models.ADOPTION_STATUS_PENDING),
+        ).where(models.Cat.id == cat_id),
     )
-    db.add(db_cat)
-    db.commit()
-    db.refresh(db_cat)
-    print(db_cat)
-    
-    return db_cat
+    if (await db.connection()).dialect.name == "mysql":
+        # No RETURNING on MySQL: the new row is read back by its primary key.
+        inserted = (await db.execute(statement)).rowcount
+        adoption = await db.get(models.Adoption, (user_id, cat_id)) if inserted else None
+    else:
+        adoption = await db.scalar(statement.returning(models.Adoption))
+    if adoption is not None:
+        # Core inserts bypass the flush events that keep the statistics and match index current.
+        deltas = stats.adoption_deltas(adoption.request_datetime, adoption.hand_over_datetime, adoption.status)
+        await (await db.connection()).run_sync(stats.add, deltas)
+    await db.commit()
+
+    if adoption is not None:
+        matching.index.apply([("adoption", adoption.cat_id, None, True)])
+        logger.debug("%r", adoption)
+
+    return adoption
+
+# MATCH ===========================================================================================
+
+async def get_cat_matches(db: AsyncSession, user_id: int, k: int):
+    ranking = matching.index.top_k(user_id, k)
+    if not ranking:
+        return []
+
+    cat_ids = [cat_id for cat_id, _ in ranking]
+    cats = {cat.id: cat for cat in await db.scalars(select(models.Cat).where(models.Cat.id.in_(cat_ids)))}
+
+    return [
+        schemas.CatMatch(id=cat.id, name=cat.name, age=cat.age, sex=cat.sex, score=score)
+        for cat_id, score in ranking
+        if (cat := cats.get(cat_id)) is not None
+    ]
+
+# RESCUE ==========================================================================================
+
+def _rescue_cursor(rescue: models.Rescue):
+    return f"{rescue.request_datetime.isoformat()}_{rescue.user_id}"
+
+async def create_rescue(db: AsyncSession, user_id: int, rescue: schemas.RescueCreate):
+    db_rescue = models.Rescue(
+        user_id = user_id,
+        request_datetime = datetime.now(),
+        status = rescues.RESCUE_STATUS_OPEN,
+        **rescue.model_dump(),
+    )
+    db.add(db_rescue)
+    await db.commit()
+    logger.debug("%r", db_rescue)
+
+    return db_rescue
+
+async def get_open_rescues(
+    db: AsyncSession,
+    limit: int,
+    cursor: str | None = None,
+    city: str | None = None,
+    state: str | None = None,
+    zipcode_prefix: str | None = None,
+):
+    """Oldest open rescues first, seeking on the (status, city), (status, zipcode) or (status, request time) index."""
+    query = select(models.Rescue).where(models.Rescue.status == rescues.RESCUE_STATUS_OPEN)
+
+    if city is not None:
+        query = query.where(models.Rescue.addr_city == city)
+    if state is not None:
+        query = query.where(models.Rescue.addr_state == state)
+    if zipcode_prefix is not None and len(zipcode_prefix) == 8:
+        query = query.where(models.Rescue.addr_zipcode == zipcode_prefix)
+    elif zipcode_prefix is not None:
+        # A range on the zipcode index would read and sort every open rescue in it on each
+        # page; `addr_zipcode || ''` keeps the planner on the request-time order, so LIMIT
+        # ends the scan. A range instead of LIKE, so it works regardless of collation settings.
+        zipcode = models.Rescue.addr_zipcode + ""
+        query = query.where(zipcode.between(zipcode_prefix.ljust(8, "0"), zipcode_prefix.ljust(8, "9")))
+    if cursor is not None:
+        query = query.where(
+            tuple_(models.Rescue.request_datetime, models.Rescue.user_id) > _parse_datetime_cursor(cursor)
+        )
+
+    items = (await db.scalars(
+        query.order_by(models.Rescue.request_datetime, models.Rescue.user_id).limit(limit + 1)
+    )).all()
+    next_cursor = _rescue_cursor(items[limit - 1]) if len(items) > limit else None
+
+    return schemas.RescuePage.model_construct(items=items[:limit], next_cursor=next_cursor)
+
+async def get_open_rescue_counts(db: AsyncSession, state: str | None = None):
+    """Reads the incrementally maintained per-region counters; never touches the rescues table."""
+    counts = models.RescueRegionCount
+    open_regions = counts.open_count > 0
+    if state is not None:
+        open_regions = open_regions & (counts.addr_state == state)
+
+    states = (await db.execute(
+        select(counts.addr_state, func.sum(counts.open_count))
+        .where(open_regions)
+        .group_by(counts.addr_state)
+        .order_by(counts.addr_state)
+    )).all()
+    cities = (await db.scalars(
+        select(counts).where(open_regions).order_by(counts.addr_state, counts.addr_city)
+    )).all()
+
+    return schemas.RescueDashboard(
+        states=[schemas.RegionOpenCount(addr_state=state, open_count=total) for state, total in states],
+        cities=[
+            schemas.RegionOpenCount(addr_state=city.addr_state, addr_city=city.addr_city, open_count=city.open_count)
+            for city in cities
+        ],
+    )
+
+# STATS ===========================================================================================
+
+async def get_stats(db: AsyncSession, days: int, today: date | None = None):
+    """Reads the incrementally maintained counters; never touches the cats, adoptions or users tables."""
+    counter = models.StatCounter
+    today = today or date.today()
+    first_day = today - timedelta(days=days - 1)
+
+    values = {
+        (name, key): value
+        for name, key, value in await db.execute(
+            select(counter.name, counter.key, counter.value)
+            .where(counter.name.in_([stats.CATS, stats.ADOPTIONS, stats.HANDOVERS, stats.HANDOVER_SECONDS]))
+        )
+    }
+    registered = {
+        key: value
+        for key, value in await db.execute(
+            select(counter.key, counter.value)
+            .where(counter.name == stats.USERS_REGISTERED, counter.key >= first_day.isoformat())
+        )
+    }
+
+    adoptions = {key: value for (name, key), value in values.items() if name == stats.ADOPTIONS and value}
+    cats = values.get((stats.CATS, ""), 0)
+    handovers = values.get((stats.HANDOVERS, ""), 0)
+    active = sum(adoptions.get(status, 0) for status in models.ADOPTION_ACTIVE_STATUSES)
+
+    return schemas.Stats(
+        cats_total = cats,
+        cats_available = cats - active,
+        cats_adopted = adoptions.get(models.ADOPTION_STATUS_COMPLETED, 0),
+        adoptions_by_status = adoptions,
+        average_handover_hours = values[stats.HANDOVER_SECONDS, ""] / handovers / 3600 if handovers else None,
+        new_users_per_day = [
+            schemas.DailyCount(day=day, count=registered.get(day.isoformat(), 0))
+            for day in (first_day + timedelta(days=offset) for offset in range(days))
+        ],
+    )
+
+# VACCINATION COVERAGE ============================================================================
+
+def _is_covered(as_of: date):
+    """
+    Whether the cat of the current `CatDisease` row has a dose of a vaccine
+    against that disease that is still valid on `as_of`. Correlated on the
+    vaccinations primary key, so each pair costs one index seek.
+    """
+    return (
+        select(models.Vaccination.cat_id)
+        .join(models.Vaccine, models.Vaccine.id == models.Vaccination.vaccine_id)
+        .where(
+            models.Vaccination.cat_id == models.CatDisease.cat_id,
+            models.Vaccine.disease_id == models.CatDisease.disease_id,
+            or_(models.Vaccination.next_date.is_(None), models.Vaccination.next_date >= as_of),
+        )
+        .exists()
+    )
+
+def uncovered_pairs_query(as_of: date):
+    return (
+        select(
+            models.CatDisease.cat_id,
+            models.Cat.name.label("cat_name"),
+            models.CatDisease.disease_id,
+            models.Disease.name.label("disease_name"),
+        )
+        .join(models.Cat, models.Cat.id == models.CatDisease.cat_id)
+        .join(models.Disease, models.Disease.id == models.CatDisease.disease_id)
+        .where(~_is_covered(as_of))
+        .order_by(models.CatDisease.cat_id, models.CatDisease.disease_id)
+    )
+
+async def get_vaccination_coverage(db: AsyncSession, as_of: date, limit: int, cursor: str | None = None):
+    diseases = (await db.execute(
+        select(
+            models.Disease.id,
+            models.Disease.name,
+            func.count(models.CatDisease.cat_id),
+            func.coalesce(func.sum(case((_is_covered(as_of), 1), else_=0)), 0),
+        )
+        .outerjoin(models.CatDisease, models.CatDisease.disease_id == models.Disease.id)
+        .group_by(models.Disease.id, models.Disease.name)
+        # Ordered like the GROUP BY, so the groups come out sorted instead of going through a temporary b-tree.
+        .order_by(models.Disease.id, models.Disease.name)
+    )).all()
+
+    query = uncovered_pairs_query(as_of).limit(limit + 1)
+    if cursor is not None:
+        query = query.where(tuple_(models.CatDisease.cat_id, models.CatDisease.disease_id) > _parse_pair_cursor(cursor))
+
+    pairs = (await db.execute(query)).all()
+    next_cursor = f"{pairs[limit - 1].cat_id}_{pairs[limit - 1].disease_id}" if len(pairs) > limit else None
+
+    return schemas.CoverageReport(
+        as_of=as_of,
+        diseases=[
+            schemas.DiseaseCoverage(
+                disease_id=id, name=name, at_risk=at_risk, covered=covered,
+                ratio=covered / at_risk if at_risk else None,
+            )
+            for id, name, at_risk, covered in diseases
+        ],
+        uncovered=[schemas.UncoveredPair.model_validate(pair._asdict()) for pair in pairs[:limit]],
+        next_cursor=next_cursor,
+    )
+
+# MESSAGE =========================================================================================
+
+MESSAGE_STATUS_SENT = "sent"
+
+def _message_cursor(message: models.Message):
+    return f"{message.sent_datetime.isoformat()}_{message.sender_id}"
+
+def _before_cursor(cursor: str | None):
+    # Newest first: keep rows strictly before the cursor in (sent_datetime, sender_id) order.
+    if cursor is None:
+        return true()
+    return tuple_(models.Message.sent_datetime, models.Message.sender_id) < _parse_datetime_cursor(cursor)
+
+def _message_page(messages: list[models.Message], limit: int):
+    next_cursor = _message_cursor(messages[limit - 1]) if len(messages) > limit else None
+    return schemas.MessagePage.model_construct(items=messages[:limit], next_cursor=next_cursor)
+
+async def create_message(db: AsyncSession, sender_id: int, message: schemas.MessageCreate):
+    db_message = models.Message(
+        sender_id = sender_id,
+        receiver_id = message.receiver_id,
+        sent_datetime = datetime.now(),
+        content = message.content,
+        status = MESSAGE_STATUS_SENT,
+    )
+    db.add(db_message)
+    await db.commit()
+
+    messaging.broker.publish(
+        db_message.receiver_id, schemas.Message.model_validate(db_message).model_dump(mode="json")
+    )
+
+    return db_message
+
+async def get_inbox(db: AsyncSession, user_id: int, limit: int, cursor: str | None = None):
+    newest_first = (models.Message.sent_datetime.desc(), models.Message.sender_id.desc())
+    query = (
+        select(models.Message)
+        .where(models.Message.receiver_id == user_id, _before_cursor(cursor))
+        .order_by(*newest_first)
+        .limit(limit + 1)
+    )
+
+    return _message_page((await db.scalars(query)).all(), limit)
+
+async def get_conversation(db: AsyncSession, user_id: int, other_id: int, limit: int, cursor: str | None = None):
+    # Each direction is its own primary key range scan, so neither side scans the table.
+    newest_first = (models.Message.sent_datetime.desc(), models.Message.sender_id.desc())
+    directions = [
+        select(models.Message)
+        .where(models.Message.sender_id == sender, models.Message.receiver_id == receiver, _before_cursor(cursor))
+        .order_by(*newest_first)
+        .limit(limit + 1)
+        .subquery()
+        for sender, receiver in ((user_id, other_id), (other_id, user_id))
+    ]
+    message = aliased(models.Message, union_all(*(select(direction) for direction in directions)).subquery())
+
+    query = (
+        select(message)
+        .order_by(message.sent_datetime.desc(), message.sender_id.desc())
+        .limit(limit + 1)
+    )
+
+    return _message_page((await db.scalars(query)).all(), limit)
+
+async def get_conversations(db: AsyncSession, user_id: int):
+    """Latest message of every conversation the user is part of, newest first, in one query."""
+    columns = [
+        models.Message.sender_id, models.Message.receiver_id, models.Message.sent_datetime,
+        models.Message.content, models.Message.status,
+    ]
+    both_directions = union_all(
+        select(*columns, models.Message.receiver_id.label("partner_id")).where(models.Message.sender_id == user_id),
+        select(*columns, models.Message.sender_id.label("partner_id")).where(models.Message.receiver_id == user_id),
+    ).subquery()
+
+    ranked = select(
+        both_directions,
+        func.row_number().over(
+            partition_by=both_directions.c.partner_id,
+            order_by=both_directions.c.sent_datetime.desc(),
+        ).label("position"),
+    ).subquery()
+
+    query = (
+        select(ranked)
+        .where(ranked.c.position == 1)
+        .order_by(ranked.c.sent_datetime.desc())
+    )
+
+    return [
+        schemas.Conversation(
+            user_id=row.partner_id,
+            last_message=schemas.Message(
+                sender_id=row.sender_id, receiver_id=row.receiver_id, sent_datetime=row.sent_datetime,
+                content=row.content, status=row.status,
+            ),
+        )
+        for row in await db.execute(query)
+    ]
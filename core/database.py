@@ -1,7 +1,14 @@
+import logging
+from os import getenv, path
+from dotenv import load_dotenv
+from sqlalchemy import event
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.engine import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.engine import create_engine, make_url
 from sqlalchemy.orm import sessionmaker
 
+load_dotenv()
+
 # USERNAME = ""
 # PASSWORD = ""
 # HOST = "localhost"
@@ -9,14 +16,127 @@ from sqlalchemy.orm import sessionmaker
 # DATABASE = "purrfect_db"
 # DATABASE_URL = f"mysql+mysqlconnector://{USERNAME}:{PASSWORD}@{HOST}:{PORT}/{DATABASE}"
 
-DATABASE_URL = "sqlite:///./data.db"
+DATABASE_URL = getenv("DATABASE_URL", "sqlite:///./data.db")
+
+# SQL statement logging (what echo=True used to print), e.g. SQL_LOG_LEVEL=INFO.
+logging.getLogger("sqlalchemy.engine").setLevel(getenv("SQL_LOG_LEVEL", "WARNING"))
+
+# Async drivers used for each sync driver. The URL is otherwise the same, so
+# both engines always point at the same database.
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "mysql": "mysql+aiomysql",
+    "mysql+mysqlconnector": "mysql+aiomysql",
+}
+
+def get_async_url(url: str):
+    sync_url = make_url(url)
+    return sync_url.set(drivername=ASYNC_DRIVERS.get(sync_url.drivername, sync_url.drivername))
+
+def get_read_url(url: str):
+    """
+    URL for the read-only pool: READ_DATABASE_URL when set (e.g. a MySQL
+    replica), a `mode=ro` URI on the same file for SQLite, otherwise the primary
+    URL itself, which still gives reads a pool of their own.
+    """
+    read_url = getenv("READ_DATABASE_URL")
+    if read_url:
+        return read_url
+
+    primary_url = make_url(url)
+    if primary_url.get_backend_name() == "sqlite" and primary_url.database not in (None, "", ":memory:"):
+        return primary_url.set(
+            database=f"file:{path.abspath(primary_url.database)}",
+            query={**primary_url.query, "mode": "ro", "uri": "true"},
+        ).render_as_string(hide_password=False)
+
+    return url
+
+def connect_args(url: str):
+    """Driver arguments for the sync engine; only SQLite takes any."""
+    if make_url(url).get_backend_name() == "sqlite":
+        # Sessions may be used from threads other than the one that opened the connection.
+        return {"check_same_thread": False}
+    return {}
+
+def pool_options(role: str):
+    """
+    Pool settings for one role (PRIMARY or READ) from DB_<ROLE>_POOL_SIZE,
+    DB_<ROLE>_MAX_OVERFLOW, DB_<ROLE>_POOL_RECYCLE and DB_<ROLE>_POOL_PRE_PING.
+    Unset values keep SQLAlchemy's defaults for the dialect.
+    """
+    options = {}
+    for option, convert in (
+        ("pool_size", int),
+        ("max_overflow", int),
+        ("pool_recycle", int),
+        ("pool_pre_ping", lambda value: value.lower() in ("1", "true", "yes")),
+    ):
+        value = getenv(f"DB_{role}_{option.upper()}")
+        if value is not None:
+            options[option] = convert(value)
+    return options
+
+ASYNC_DATABASE_URL = get_async_url(DATABASE_URL)
+ASYNC_READ_DATABASE_URL = get_async_url(get_read_url(DATABASE_URL))
 
 engine = create_engine(
     url=DATABASE_URL,
-    connect_args={"check_same_thread": False}, # ONLY FOR SQLITE
-    echo=True,
+    connect_args=connect_args(DATABASE_URL),
 )
 
+async_engine = create_async_engine(
+    url=ASYNC_DATABASE_URL,
+    **pool_options("PRIMARY"),
+)
+
+# In-memory SQLite cannot be shared between pools, so reads stay on the primary.
+async_read_engine = (
+    async_engine
+    if ASYNC_READ_DATABASE_URL == ASYNC_DATABASE_URL and make_url(DATABASE_URL).get_backend_name() == "sqlite"
+    else create_async_engine(url=ASYNC_READ_DATABASE_URL, **pool_options("READ"))
+)
+
+# Optional SQLite tuning, e.g. SQLITE_JOURNAL_MODE=WAL and SQLITE_SYNCHRONOUS=NORMAL:
+# WAL lets readers run while a writer commits, which the group-commit writer relies on.
+SQLITE_PRAGMAS = {
+    name: value
+    for name, value in (
+        ("journal_mode", getenv("SQLITE_JOURNAL_MODE")),
+        ("synchronous", getenv("SQLITE_SYNCHRONOUS")),
+        ("busy_timeout", getenv("SQLITE_BUSY_TIMEOUT_MS")),
+    )
+    if value
+}
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in SQLITE_PRAGMAS.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+if SQLITE_PRAGMAS and engine.dialect.name == "sqlite":
+    # The read-only pool cannot change the journal mode; it inherits it from the file.
+    for sync_engine in (engine, async_engine.sync_engine):
+        event.listen(sync_engine, "connect", _set_sqlite_pragmas)
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# Objects must stay readable after commit without an implicit (blocking) refresh.
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
+# Sessions for read-only dependencies. Anything that writes, or must read its
+# own writes (replicas lag), uses AsyncSessionLocal.
+AsyncReadSessionLocal = async_sessionmaker(
+    bind=async_read_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False,
+)
+
 Base = declarative_base()
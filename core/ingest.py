@@ -0,0 +1,289 @@
+"""
+Bulk cat ingestion from NDJSON or CSV streams.
+
+Rows are validated and written in chunks: each chunk is one transaction with a
+single multi-row INSERT ... RETURNING for the cats (on MySQL, which has no
+RETURNING, the new ids are read back by their unique names) and one executemany
+per association table. Invalid rows are reported with their row number and never
+abort the rest of the import. Cat names are unique: a row whose name is already
+taken, in the database or earlier in the file, is skipped and reported. If the
+database still rejects a chunk, its rows are retried one by one so only the
+offending ones are reported.
+
+Command line usage:
+
+    python -m core.ingest cats.ndjson
+    python -m core.ingest cats.csv --format csv --chunk-size 2000
+
+CSV files need a header with `name,age,sex` and optionally `colors`,
+`personalities` (ids separated by `;`), `physical_description` and
+`vaccinations` (`vaccine_id:dose:appl_date[:next_date]` separated by `;`).
+"""
+import argparse
+import asyncio
+import codecs
+import csv
+import json
+from collections import Counter
+from typing import AsyncIterator
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import matching, models, schemas, search, stats
+
+CHUNK_SIZE = 1000
+ERROR_MAX_LENGTH = 200
+DUPLICATE_NAME_ERROR = "Gato de mesmo nome já cadastrado."
+
+# PARSING =========================================================================================
+
+async def stream_lines(chunks: AsyncIterator[bytes]):
+    """Splits a stream of UTF-8 byte chunks (e.g. a request body) into text lines."""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending = ""
+
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            yield line + "\n"
+
+    pending += decoder.decode(b"", final=True)
+    if pending:
+        yield pending
+
+async def _ndjson_records(lines: AsyncIterator[str]):
+    async for line in lines:
+        if line.strip():
+            yield line
+
+async def _csv_records(lines: AsyncIterator[str]):
+    # A CSV record may span lines inside quotes; it is complete once its quotes balance.
+    pending = ""
+    async for line in lines:
+        pending += line
+        if pending.count('"') % 2 == 0:
+            if pending.strip():
+                yield pending
+            pending = ""
+
+    if pending.strip():
+        yield pending
+
+def _split_ids(value: str):
+    return [int(item) for item in value.split(";") if item.strip()]
+
+def _split_vaccinations(value: str):
+    vaccinations = []
+    for item in value.split(";"):
+        if not item.strip():
+            continue
+
+        vaccine_id, dose, appl_date, *next_date = item.split(":")
+        vaccinations.append({
+            "vaccine_id": vaccine_id,
+            "dose": dose,
+            "appl_date": appl_date,
+            "next_date": next_date[0] if next_date and next_date[0] else None,
+        })
+
+    return vaccinations
+
+def _csv_row(header: list[str], record: str):
+    values = next(csv.reader([record]))
+    row = dict(zip(header, values))
+
+    if "colors" in row:
+        row["colors"] = _split_ids(row["colors"])
+    if "personalities" in row:
+        row["personalities"] = _split_ids(row["personalities"])
+    if "vaccinations" in row:
+        row["vaccinations"] = _split_vaccinations(row["vaccinations"])
+    if not row.get("physical_description"):
+        row.pop("physical_description", None)
+
+    return row
+
+def _format_error(exc: Exception):
+    if isinstance(exc, ValidationError):
+        return "; ".join(f"{'.'.join(map(str, error['loc']))}: {error['msg']}" for error in exc.errors())
+    if isinstance(exc, SQLAlchemyError):
+        # Only the driver's message: str(exc) also carries the SQL and every parameter of the chunk.
+        return f"Rejeitado pelo banco de dados: {getattr(exc, 'orig', None) or type(exc).__name__}"[:ERROR_MAX_LENGTH]
+    return str(exc)
+
+# WRITING =========================================================================================
+
+async def _reference_ids(db: AsyncSession):
+    return (
+        set(await db.scalars(select(models.Color.id))),
+        set(await db.scalars(select(models.Personality.id))),
+        set(await db.scalars(select(models.Vaccine.id))),
+    )
+
+def _check_references(cat: schemas.CatImport, color_ids: set, personality_ids: set, vaccine_ids: set):
+    missing = []
+    missing += [f"color {id}" for id in cat.colors if id not in color_ids]
+    missing += [f"personality {id}" for id in cat.personalities if id not in personality_ids]
+    missing += [f"vaccine {vaccination.vaccine_id}" for vaccination in cat.vaccinations if vaccination.vaccine_id not in vaccine_ids]
+
+    if missing:
+        raise ValueError("Referências inexistentes: " + ", ".join(missing))
+
+    vaccine_counts = Counter(vaccination.vaccine_id for vaccination in cat.vaccinations)
+    repeated = [str(id) for id, count in vaccine_counts.items() if count > 1]
+    if repeated:
+        raise ValueError("Vacinas repetidas: " + ", ".join(repeated))
+
+async def _insert_cats(db: AsyncSession, cats: list[schemas.CatImport]):
+    """Inserts the cats; returns their new ids in `cats` order."""
+    rows = [{"name": cat.name, "age": cat.age, "sex": cat.sex} for cat in cats]
+
+    if (await db.connection()).dialect.name == "mysql":
+        # No RETURNING on MySQL, and auto-increment ids are only consecutive under
+        # some lock modes: the names are unique, so one IN query reads the ids back.
+        await db.execute(insert(models.Cat.__table__), rows)
+        ids = dict((await db.execute(
+            select(models.Cat.name, models.Cat.id).where(models.Cat.name.in_([cat.name for cat in cats]))
+        )).all())
+        return [ids[cat.name] for cat in cats]
+
+    # Multi-row VALUES inserts hand out ascending rowids in VALUES order, so sorting
+    # the returned ids lines them up with `cats` without SQLAlchemy's much slower
+    # one-row-per-statement `sort_by_parameter_order` mode.
+    return sorted((await db.scalars(insert(models.Cat.__table__).returning(models.Cat.id), rows)).all())
+
+async def _write_chunk(db: AsyncSession, cats: list[schemas.CatImport]):
+    cat_ids = await _insert_cats(db, cats)
+
+    cat_colors = [
+        {"cat_id": cat_id, "color_id": color_id}
+        for cat_id, cat in zip(cat_ids, cats) for color_id in set(cat.colors)
+    ]
+    cat_personalities = [
+        {"cat_id": cat_id, "personality_id": personality_id}
+        for cat_id, cat in zip(cat_ids, cats) for personality_id in set(cat.personalities)
+    ]
+    vaccinations = [
+        {"cat_id": cat_id, **vaccination.model_dump()}
+        for cat_id, cat in zip(cat_ids, cats) for vaccination in cat.vaccinations
+    ]
+    descriptions = [
+        {"cat_id": cat_id, "description": cat.physical_description}
+        for cat_id, cat in zip(cat_ids, cats) if cat.physical_description is not None
+    ]
+
+    for model, rows in (
+        (models.CatColor, cat_colors),
+        (models.CatPersonality, cat_personalities),
+        (models.Vaccination, vaccinations),
+        (models.PhysicalDescription, descriptions),
+    ):
+        if rows:
+            await db.execute(insert(model.__table__), rows)
+
+    # Core inserts bypass the ORM events that keep the search documents, statistics and match index current.
+    await (await db.connection()).run_sync(search.refresh_documents, cat_ids)
+    await (await db.connection()).run_sync(stats.add, Counter({(stats.CATS, ""): len(cat_ids)}))
+    await db.commit()
+
+    matching.index.apply(
+        [("cat", cat_id, None, True) for cat_id in cat_ids]
+        + [("cat_color", row["cat_id"], row["color_id"], True) for row in cat_colors]
+        + [("cat_personality", row["cat_id"], row["personality_id"], True) for row in cat_personalities]
+    )
+
+    return cat_ids
+
+async def import_cats(db: AsyncSession, lines: AsyncIterator[str], format: str = "ndjson", chunk_size: int = CHUNK_SIZE):
+    """Imports cats from an async iterator of text lines and returns a `schemas.ImportResult`."""
+    color_ids, personality_ids, vaccine_ids = await _reference_ids(db)
+    records = _csv_records(lines) if format == "csv" else _ndjson_records(lines)
+
+    header = None
+    if format == "csv":
+        first = await anext(records, None)
+        header = next(csv.reader([first])) if first else []
+        header = [column.strip() for column in header]
+
+    created = 0
+    errors = []
+    chunk = []
+    chunk_rows = []
+
+    async def write(cats: list[schemas.CatImport], rows: list[int]):
+        nonlocal created
+        try:
+            created += len(await _write_chunk(db, cats))
+        except SQLAlchemyError as exc:
+            await db.rollback()
+            if len(cats) == 1:
+                errors.append(schemas.ImportRowError(row=rows[0], error=_format_error(exc)))
+                return
+            for cat, row in zip(cats, rows):
+                await write([cat], [row])
+
+    async def flush():
+        # One IN query for the whole chunk; names seen earlier in it count as taken too.
+        taken = set(await db.scalars(select(models.Cat.name).where(models.Cat.name.in_({cat.name for cat in chunk}))))
+        cats, rows = [], []
+        for cat, row in zip(chunk, chunk_rows):
+            if cat.name in taken:
+                errors.append(schemas.ImportRowError(row=row, error=DUPLICATE_NAME_ERROR))
+                continue
+            taken.add(cat.name)
+            cats.append(cat)
+            rows.append(row)
+
+        if cats:
+            await write(cats, rows)
+        chunk.clear()
+        chunk_rows.clear()
+
+    row_number = 0
+    async for record in records:
+        row_number += 1
+        try:
+            raw = _csv_row(header, record) if format == "csv" else json.loads(record)
+            cat = schemas.CatImport.model_validate(raw)
+            _check_references(cat, color_ids, personality_ids, vaccine_ids)
+        except (ValueError, TypeError, ValidationError) as exc:
+            errors.append(schemas.ImportRowError(row=row_number, error=_format_error(exc)))
+            continue
+
+        chunk.append(cat)
+        chunk_rows.append(row_number)
+        if len(chunk) >= chunk_size:
+            await flush()
+
+    if chunk:
+        await flush()
+
+    errors.sort(key=lambda error: error.row)
+    return schemas.ImportResult(rows=row_number, created=created, errors=errors)
+
+# COMMAND LINE ====================================================================================
+
+async def _file_lines(path: str):
+    with open(path, newline="", encoding="utf-8") as file:
+        for line in file:
+            yield line
+
+async def _main(path: str, format: str, chunk_size: int):
+    from .database import AsyncSessionLocal
+
+    async with AsyncSessionLocal() as db:
+        result = await import_cats(db, _file_lines(path), format, chunk_size)
+
+    print(result.model_dump_json(indent=2))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Importa gatos em massa a partir de NDJSON ou CSV.")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=["ndjson", "csv"], default=None)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    format = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    asyncio.run(_main(args.path, format, args.chunk_size))
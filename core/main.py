@@ -1,27 +1,75 @@
+import asyncio
 import jwt
+import logging
 from jwt.exceptions import InvalidTokenError
-from datetime import timedelta, time
-from typing import Annotated
-from fastapi import Depends, FastAPI, HTTPException
+from contextlib import asynccontextmanager, suppress
+from os import getenv
+from datetime import date, timedelta, time
+from typing import Annotated, Literal
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from . import security
-from . import crud, models, schemas
-from .database import SessionLocal, engine
+from . import crud, export, ingest, matching, messaging, metrics, migrations, reminders, schemas, serialization, writer
+from .cache import etag_matches, reference_cache, user_cache
+from .database import AsyncReadSessionLocal, AsyncSessionLocal, async_engine, async_read_engine
 
-models.Base.metadata.create_all(bind=engine)
+logging.basicConfig(level=getenv("LOG_LEVEL", "WARNING"))
+
+metrics.instrument_engine(async_engine.sync_engine, "primary")
+if async_read_engine is not async_engine:
+    metrics.instrument_engine(async_read_engine.sync_engine, "read")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # The schema is owned by `python -m core.migrations upgrade`; workers only check its version.
+    async with async_engine.connect() as conn:
+        await conn.run_sync(migrations.check_schema_version)
 
-def get_db():
-    db = SessionLocal()
-    try:
+    async with AsyncSessionLocal() as db:
+        await matching.index.load(db)
+        await reference_cache.load_all(db)
+
+    scheduler = None
+    if reminders.VACCINATION_REMINDER_INTERVAL_IN_SECONDS > 0:
+        scheduler = asyncio.create_task(reminders.run_forever())
+
+    if writer.WRITE_BATCHING:
+        writer.group_writer.start()
+
+    yield
+
+    await writer.group_writer.stop()
+
+    if scheduler is not None:
+        scheduler.cancel()
+        with suppress(asyncio.CancelledError):
+            await scheduler
+
+app = FastAPI(lifespan=lifespan)
+app.add_middleware(metrics.MetricsMiddleware)
+
+# Keyset cursors of the form `<isoformat>_<id>` (messages, rescues).
+DATETIME_CURSOR_PATTERN = r"^\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}(\.\d{1,6})?_\d{1,19}$"
+
+@app.exception_handler(crud.InvalidCursorError)
+async def invalid_cursor(request: Request, exc: crud.InvalidCursorError):
+    # Matches the pattern but does not parse (e.g. month 13).
+    return JSONResponse(status_code=400, content={"detail": "Cursor de paginação inválido."})
+
+async def get_db():
+    async with AsyncSessionLocal() as db:
         yield db
-    finally:
-        db.close_all()   
 
-def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)):
+async def get_read_db():
+    """Session on the read-only pool, for endpoints that neither write nor need their own writes back."""
+    async with AsyncReadSessionLocal() as db:
+        yield db
+
+async def resolve_user(token: str, db: AsyncSession):
     try:
         payload = jwt.decode(token, security.SECRET_KEY, algorithms=[security.ALGORITHM])
         username = payload.get("sub")
@@ -33,16 +81,30 @@ def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: Session
     except InvalidTokenError:
         raise security.CREDENTIALS_EXPIRATION_HTTPEXCEPTION
     
-    user = crud.get_user_by_username(db, token_data.username)
+    user = user_cache.get(token_data.username)
 
     if user is None:
-        raise security.CREDENTIALS_EXPIRATION_HTTPEXCEPTION
+        db_user = await crud.get_user_by_username(db, token_data.username)
+
+        if db_user is None:
+            raise security.CREDENTIALS_EXPIRATION_HTTPEXCEPTION
+
+        user = schemas.UserSnapshot.model_validate(db_user)
+        user_cache.set(token_data.username, user, expires_at=payload.get("exp"))
     
     return user
 
+async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)], db: AsyncSession = Depends(get_db)):
+    return await resolve_user(token, db)
+
+async def get_staff_user(current_user: Annotated[schemas.UserSnapshot, Depends(get_current_user)]):
+    if current_user.role not in security.STAFF_ROLES:
+        raise security.FORBIDDEN_HTTPEXCEPTION
+    return current_user
+
 @app.post("/auth")
-def get_token(form_data : Annotated[OAuth2PasswordRequestForm, Depends()], db: Session = Depends(get_db)):
-    user = crud.authenticate_user(form_data.username, form_data.password, db)
+async def get_token(form_data : Annotated[OAuth2PasswordRequestForm, Depends()], db: AsyncSession = Depends(get_db)):
+    user = await crud.authenticate_user(form_data.username, form_data.password, db)
     if not user:
         raise security.UNAUTHORIZED_HTTPEXCEPTION
     
@@ -52,44 +114,355 @@ def get_token(form_data : Annotated[OAuth2PasswordRequestForm, Depends()], db: S
     )
     return security.Token(access_token=access_token, token_type="bearer")
 
+# REFERENCE DATA ==================================================================================
+
+async def reference_response(name: str, request: Request, db: AsyncSession):
+    etag, body = await reference_cache.get(db, name)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+@app.get("/colors", response_model=list[schemas.Color])
+async def get_colors(request: Request, db: AsyncSession = Depends(get_db)):
+    return await reference_response("colors", request, db)
+
+@app.get("/personalities", response_model=list[schemas.Personality])
+async def get_personalities(request: Request, db: AsyncSession = Depends(get_db)):
+    return await reference_response("personalities", request, db)
+
+@app.get("/diseases", response_model=list[schemas.Disease])
+async def get_diseases(request: Request, db: AsyncSession = Depends(get_db)):
+    return await reference_response("diseases", request, db)
+
+@app.get("/vaccines", response_model=list[schemas.Vaccine])
+async def get_vaccines(request: Request, db: AsyncSession = Depends(get_db)):
+    return await reference_response("vaccines", request, db)
+
 # USER ============================================================================================
 
 @app.get("/user", response_model=schemas.User)
-def get_user(id: int, db: Session = Depends(get_db)):
-    res = crud.get_user_by_id(db, id)
+async def get_user(id: int, db: AsyncSession = Depends(get_read_db)):
+    res = await crud.get_user_by_id(db, id)
 
     if not res:
         raise HTTPException(status_code=404, detail="Usuário não encontrado no banco de dados.")
     return res
 
+@app.get("/users/batch", response_model=schemas.UserBatch)
+async def get_users_batch(
+    ids: Annotated[list[int], Query(min_length=1, max_length=schemas.BATCH_MAX_IDS)],
+    db: AsyncSession = Depends(get_read_db),
+):
+    return serialization.page_response(schemas.User, await crud.get_users_by_ids(db, ids))
+
+@app.post("/users/batch", response_model=schemas.UserBatch)
+async def post_users_batch(batch: schemas.BatchRequest, db: AsyncSession = Depends(get_read_db)):
+    """Same as `GET /users/batch`, for id lists too long for a URL."""
+    return serialization.page_response(schemas.User, await crud.get_users_by_ids(db, batch.ids))
+
 @app.get("/user/me/", response_model=schemas.User)
-def read_users_me(current_user: Annotated[models.User, Depends(get_current_user)]):
+async def read_users_me(current_user: Annotated[schemas.UserSnapshot, Depends(get_current_user)]):
     return current_user
 
+@app.put("/user/me/preferences", response_model=schemas.Preferences)
+async def replace_preferences(
+    preferences: schemas.Preferences,
+    current_user: Annotated[schemas.UserSnapshot, Depends(get_current_user)],
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        result = await crud.replace_preferences(db, current_user.id, preferences)
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="Preferências alteradas por outra requisição, tente novamente.")
+
+    if result is None:
+        raise HTTPException(status_code=400, detail="Cor ou personalidade não encontrada no banco de dados.")
+
+    return result
+
 @app.post("/user", response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_username(db, user.username)
+async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
+    if user.role == reminders.SYSTEM_ROLE or user.username == reminders.REMINDER_SENDER_USERNAME:
+        raise HTTPException(status_code=400, detail="Nome de usuário ou papel reservado ao sistema.")
+    if user.role in security.STAFF_ROLES:
+        raise HTTPException(status_code=400, detail="Papel reservado à equipe do abrigo.")
 
-    if db_user:
+    try:
+        return await crud.create_user(db, user)
+    except IntegrityError:
         raise HTTPException(status_code=400, detail="Nome de usuário já cadastrado.")
-    
-    return crud.create_user(db, user)
 
 # CAT =============================================================================================
 
 @app.get("/cat", response_model=schemas.Cat)
-def get_cat(id: int, db: Session = Depends(get_db)):
-    res = crud.get_cat_by_id(db, id)
+async def get_cat(id: int, db: AsyncSession = Depends(get_read_db)):
+    res = await crud.get_cat_by_id(db, id)
     if not res:
         raise HTTPException(status_code=404, detail="Gato não encontrado no banco de dados.")
 
     return res
 
-@app.post("/cat", response_model=schemas.Cat)
-def create_cat(cat: schemas.CatCreate, db: Session = Depends(get_db)):
-    db_cat = crud.get_cat_by_name(db, cat.name)
+@app.get("/cats/batch", response_model=schemas.CatBatch)
+async def get_cats_batch(
+    ids: Annotated[list[int], Query(min_length=1, max_length=schemas.BATCH_MAX_IDS)],
+    db: AsyncSession = Depends(get_read_db),
+):
+    return serialization.page_response(schemas.Cat, await crud.get_cats_by_ids(db, ids))
+
+@app.post("/cats/batch", response_model=schemas.CatBatch)
+async def post_cats_batch(batch: schemas.BatchRequest, db: AsyncSession = Depends(get_read_db)):
+    """Same as `GET /cats/batch`, for id lists too long for a URL."""
+    return serialization.page_response(schemas.Cat, await crud.get_cats_by_ids(db, batch.ids))
+
+@app.get("/cat/profile", response_model=schemas.CatProfile)
+async def get_cat_profile(id: int, db: AsyncSession = Depends(get_read_db)):
+    res = await crud.get_cat_profile_by_id(db, id)
+    if not res:
+        raise HTTPException(status_code=404, detail="Gato não encontrado no banco de dados.")
+
+    return res
+
+@app.get("/cats", response_model=schemas.CatPage)
+async def get_cats(
+    filters: Annotated[schemas.CatFilters, Depends()],
+    cursor: int | None = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    db: AsyncSession = Depends(get_read_db),
+):
+    return serialization.page_response(schemas.Cat, await crud.get_cats(db, limit, cursor, filters))
+
+@app.get("/cats/search", response_model=schemas.CatSearchPage)
+async def search_cats(
+    q: Annotated[str, Query(min_length=1, max_length=200)],
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    offset: Annotated[int, Query(ge=0, le=1000)] = 0,
+    db: AsyncSession = Depends(get_read_db),
+):
+    return await crud.search_cats(db, q, limit, offset)
+
+@app.get("/cats/profiles", response_model=schemas.CatProfilePage)
+async def get_cat_profiles(
+    filters: Annotated[schemas.CatFilters, Depends()],
+    cursor: int | None = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    db: AsyncSession = Depends(get_read_db),
+):
+    return await crud.get_cat_profiles(db, limit, cursor, filters)
 
-    if db_cat:
+@app.post("/cat", response_model=schemas.Cat)
+async def create_cat(cat: schemas.CatCreate, db: AsyncSession = Depends(get_db)):
+    try:
+        return await crud.create_cat(db, cat)
+    except IntegrityError:
         raise HTTPException(status_code=400, detail="Gato de mesmo nome já cadastrado.")
 
-    return crud.create_cat(db, cat)
+@app.post("/cats/import", response_model=schemas.ImportResult)
+async def import_cats(request: Request, db: AsyncSession = Depends(get_db)):
+    """Bulk import from an NDJSON (default) or `text/csv` request body."""
+    format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+
+    return await ingest.import_cats(db, ingest.stream_lines(request.stream()), format)
+
+# ADOPTION ========================================================================================
+
+@app.post("/adoptions", response_model=schemas.Adoption, status_code=201)
+async def create_adoption(
+    adoption: schemas.AdoptionCreate,
+    current_user: Annotated[schemas.UserSnapshot, Depends(get_current_user)],
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        db_adoption = await crud.create_adoption(db, current_user.id, adoption.cat_id)
+    except IntegrityError:
+        raise HTTPException(status_code=409, detail="Gato já possui uma adoção ativa.")
+
+    if db_adoption is None:
+        raise HTTPException(status_code=404, detail="Gato não encontrado no banco de dados.")
+
+    return db_adoption
+
+# MATCH ===========================================================================================
+
+@app.get("/match", response_model=list[schemas.CatMatch])
+async def get_matches(
+    current_user: Annotated[schemas.UserSnapshot, Depends(get_current_user)],
+    k: Annotated[int, Query(ge=1, le=100)] = 10,
+    db: AsyncSession = Depends(get_read_db),
+):
+    return await crud.get_cat_matches(db, current_user.id, k)
+
+# EXPORT ==========================================================================================
+
+@app.get("/export/{table_name}")
+async def export_table(
+    table_name: Literal["cats", "adoptions", "rescues"],
+    current_user: Annotated[schemas.UserSnapshot, Depends(get_staff_user)],
+    format: Literal["ndjson", "csv"] = "ndjson",
+):
+    return StreamingResponse(
+        export.export_rows(export.EXPORT_TABLES[table_name], format),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{table_name}.{format}"'},
+    )
+
+# RESCUE ==========================================================================================
+
+@app.post("/rescues", response_model=schemas.Rescue)
+async def create_rescue(
+    rescue: schemas.RescueCreate,
+    current_user: Annotated[schemas.UserSnapshot, Depends(get_current_user)],
+    db: AsyncSession = Depends(get_db),
+):
+    return await crud.create_rescue(db, current_user.id, rescue)
+
+@app.get("/rescues/open", response_model=schemas.RescuePage)
+async def get_open_rescues(
+    city: str | None = None,
+    state: str | None = None,
+    zipcode_prefix: Annotated[str | None, Query(pattern=r"^\d{1,8}$")] = None,
+    cursor: Annotated[str | None, Query(pattern=DATETIME_CURSOR_PATTERN)] = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    db: AsyncSession = Depends(get_read_db),
+):
+    if city is None and zipcode_prefix is None:
+        raise HTTPException(status_code=400, detail="Informe a cidade ou o prefixo do CEP.")
+
+    page = await crud.get_open_rescues(db, limit, cursor, city, state, zipcode_prefix)
+    return serialization.page_response(schemas.Rescue, page)
+
+@app.get("/rescues/open/counts", response_model=schemas.RescueDashboard)
+async def get_open_rescue_counts(state: str | None = None, db: AsyncSession = Depends(get_read_db)):
+    return await crud.get_open_rescue_counts(db, state)
+
+# STATS ===========================================================================================
+
+@app.get("/stats", response_model=schemas.Stats)
+async def get_stats(
+    current_user: Annotated[schemas.UserSnapshot, Depends(get_staff_user)],
+    days: Annotated[int, Query(ge=1, le=366)] = 30,
+    db: AsyncSession = Depends(get_read_db),
+):
+    return await crud.get_stats(db, days)
+
+# VACCINATION COVERAGE ============================================================================
+
+@app.get("/vaccinations/coverage", response_model=schemas.CoverageReport)
+async def get_vaccination_coverage(
+    current_user: Annotated[schemas.UserSnapshot, Depends(get_staff_user)],
+    as_of: date | None = None,
+    cursor: Annotated[str | None, Query(pattern=r"^\d{1,19}_\d{1,19}$")] = None,
+    limit: Annotated[int, Query(ge=1, le=1000)] = 100,
+    db: AsyncSession = Depends(get_read_db),
+):
+    return await crud.get_vaccination_coverage(db, as_of or date.today(), limit, cursor)
+
+@app.get("/vaccinations/coverage/export")
+async def export_vaccination_coverage(
+    current_user: Annotated[schemas.UserSnapshot, Depends(get_staff_user)],
+    as_of: date | None = None,
+    format: Literal["ndjson", "csv"] = "ndjson",
+):
+    return StreamingResponse(
+        export.export_query(crud.uncovered_pairs_query(as_of or date.today()), format),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="vaccination_coverage.{format}"'},
+    )
+
+# MESSAGE =========================================================================================
+
+@app.post("/messages", response_model=schemas.Message)
+async def send_message(
+    message: schemas.MessageCreate,
+    current_user: Annotated[schemas.UserSnapshot, Depends(get_current_user)],
+    db: AsyncSession = Depends(get_db),
+):
+    if not await crud.get_user_by_id(db, message.receiver_id):
+        raise HTTPException(status_code=404, detail="Usuário não encontrado no banco de dados.")
+
+    return await crud.create_message(db, current_user.id, message)
+
+@app.get("/messages/inbox", response_model=schemas.MessagePage)
+async def get_inbox(
+    current_user: Annotated[schemas.UserSnapshot, Depends(get_current_user)],
+    cursor: Annotated[str | None, Query(pattern=DATETIME_CURSOR_PATTERN)] = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    db: AsyncSession = Depends(get_db),
+):
+    return serialization.page_response(schemas.Message, await crud.get_inbox(db, current_user.id, limit, cursor))
+
+@app.get("/messages/conversations", response_model=list[schemas.Conversation])
+async def get_conversations(
+    current_user: Annotated[schemas.UserSnapshot, Depends(get_current_user)],
+    db: AsyncSession = Depends(get_db),
+):
+    return await crud.get_conversations(db, current_user.id)
+
+@app.get("/messages/conversations/{user_id}", response_model=schemas.MessagePage)
+async def get_conversation(
+    user_id: int,
+    current_user: Annotated[schemas.UserSnapshot, Depends(get_current_user)],
+    cursor: Annotated[str | None, Query(pattern=DATETIME_CURSOR_PATTERN)] = None,
+    limit: Annotated[int, Query(ge=1, le=100)] = 20,
+    db: AsyncSession = Depends(get_db),
+):
+    page = await crud.get_conversation(db, current_user.id, user_id, limit, cursor)
+    return serialization.page_response(schemas.Message, page)
+
+@app.websocket("/messages/ws")
+async def message_socket(websocket: WebSocket, token: str):
+    """Pushes every message sent to the authenticated user while the socket is open."""
+    try:
+        # Short-lived session: the socket must not hold a pooled connection while idle.
+        async with AsyncSessionLocal() as db:
+            user = await resolve_user(token, db)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+
+    with messaging.broker.subscribe(user.id) as queue:
+        receive = asyncio.ensure_future(websocket.receive())
+        try:
+            while True:
+                deliver = asyncio.ensure_future(queue.get())
+                done, _ = await asyncio.wait({receive, deliver}, return_when=asyncio.FIRST_COMPLETED)
+
+                if deliver in done:
+                    await websocket.send_json(deliver.result())
+                else:
+                    deliver.cancel()
+
+                # Clients have nothing to send; receiving only detects the disconnect.
+                if receive in done:
+                    if receive.result()["type"] == "websocket.disconnect":
+                        break
+                    receive = asyncio.ensure_future(websocket.receive())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            receive.cancel()
+
+# METRICS =========================================================================================
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    cache_stats = user_cache.stats()
+    extra = metrics.render_samples(
+        "user_cache_requests_total", "Authenticated user cache lookups.", "counter",
+        [({"result": "hit"}, cache_stats["hits"]), ({"result": "miss"}, cache_stats["misses"])],
+    )
+    extra += metrics.render_samples(
+        "user_cache_size", "Users currently cached.", "gauge", [({}, cache_stats["size"])],
+    )
+    extra += metrics.render_samples(
+        "password_hash_pending", "Password hashes queued or running.", "gauge", [({}, security.pending_hashes())],
+    )
+
+    return PlainTextResponse(
+        metrics.render(extra),
+        media_type="text/plain; version=0.0.4",
+    )
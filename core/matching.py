@@ -0,0 +1,252 @@
+from threading import Lock
+import numpy as np
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from . import models, stats
+from .cache import preferences_changed
+
+class MatchIndex:
+    """
+    In-memory index of every cat's colors and personalities used to rank cats
+    against a user's preferences.
+
+    Each cat is one row of two 0/1 matrices (one column per color id and per
+    personality id), so ranking the whole catalog is a couple of vectorized
+    column sums instead of a SQL join per request. The index is loaded once at
+    startup and kept up to date from committed ORM changes.
+    """
+
+    INITIAL_CAPACITY = 1024
+
+    def __init__(self):
+        self.lock = Lock()
+        self.ready = False
+        self._reset()
+
+    def _reset(self):
+        self.size = 0
+        self.cat_ids = np.zeros(self.INITIAL_CAPACITY, dtype=np.int64)
+        self.active = np.zeros(self.INITIAL_CAPACITY, dtype=bool)
+        self.adopted = np.zeros(self.INITIAL_CAPACITY, dtype=bool)
+        self.colors = np.zeros((self.INITIAL_CAPACITY, 1), dtype=np.uint8)
+        self.personalities = np.zeros((self.INITIAL_CAPACITY, 1), dtype=np.uint8)
+        self.rows = {}
+        self.active_adoptions = {}
+        self.preferences = {}
+
+    # LOADING =====================================================================================
+
+    async def load(self, db: AsyncSession):
+        cat_ids = (await db.scalars(select(models.Cat.id).order_by(models.Cat.id))).all()
+        cat_colors = (await db.execute(select(models.CatColor.cat_id, models.CatColor.color_id))).all()
+        cat_personalities = (await db.execute(
+            select(models.CatPersonality.cat_id, models.CatPersonality.personality_id)
+        )).all()
+        adopted = (await db.scalars(
+            select(models.Adoption.cat_id).where(models.Adoption.status.in_(models.ADOPTION_ACTIVE_STATUSES))
+        )).all()
+        color_prefs = (await db.execute(
+            select(models.ColorPreference.user_id, models.ColorPreference.color_id)
+        )).all()
+        personality_prefs = (await db.execute(
+            select(models.PersonalityPreference.user_id, models.PersonalityPreference.personality_id)
+        )).all()
+
+        with self.lock:
+            self._reset()
+            for cat_id in cat_ids:
+                self._add_cat(cat_id)
+            for cat_id, color_id in cat_colors:
+                self._set_trait("colors", cat_id, color_id, 1)
+            for cat_id, personality_id in cat_personalities:
+                self._set_trait("personalities", cat_id, personality_id, 1)
+            for cat_id in adopted:
+                self._set_adopted(cat_id, True)
+            for user_id, color_id in color_prefs:
+                self._user_preferences(user_id)[0].add(color_id)
+            for user_id, personality_id in personality_prefs:
+                self._user_preferences(user_id)[1].add(personality_id)
+            self.ready = True
+
+    # INCREMENTAL UPDATES =========================================================================
+
+    def _grow_rows(self, needed: int):
+        capacity = len(self.cat_ids)
+        if needed <= capacity:
+            return
+
+        while capacity < needed:
+            capacity *= 2
+
+        extra = capacity - len(self.cat_ids)
+        self.cat_ids = np.concatenate([self.cat_ids, np.zeros(extra, dtype=np.int64)])
+        self.active = np.concatenate([self.active, np.zeros(extra, dtype=bool)])
+        self.adopted = np.concatenate([self.adopted, np.zeros(extra, dtype=bool)])
+        self.colors = np.pad(self.colors, ((0, extra), (0, 0)))
+        self.personalities = np.pad(self.personalities, ((0, extra), (0, 0)))
+
+    def _add_cat(self, cat_id: int):
+        if cat_id in self.rows:
+            return self.rows[cat_id]
+
+        self._grow_rows(self.size + 1)
+        row = self.size
+        self.size += 1
+        self.rows[cat_id] = row
+        self.cat_ids[row] = cat_id
+        self.active[row] = True
+        self.adopted[row] = cat_id in self.active_adoptions
+        return row
+
+    def _remove_cat(self, cat_id: int):
+        row = self.rows.pop(cat_id, None)
+        if row is None:
+            return
+
+        # Rows are never compacted; a removed cat just stops being a candidate.
+        self.active[row] = False
+        self.colors[row] = 0
+        self.personalities[row] = 0
+
+    def _set_trait(self, matrix_name: str, cat_id: int, trait_id: int, value: int):
+        row = self._add_cat(cat_id)
+        matrix = getattr(self, matrix_name)
+
+        if trait_id >= matrix.shape[1]:
+            matrix = np.pad(matrix, ((0, 0), (0, trait_id + 1 - matrix.shape[1])))
+            setattr(self, matrix_name, matrix)
+
+        matrix[row, trait_id] = value
+
+    def _set_adopted(self, cat_id: int, adopted: bool):
+        # Counted, not flagged: ending one active adoption must not un-adopt a
+        # cat that still has another (MySQL does not enforce at most one).
+        count = self.active_adoptions.get(cat_id, 0) + (1 if adopted else -1)
+        if count > 0:
+            self.active_adoptions[cat_id] = count
+        else:
+            self.active_adoptions.pop(cat_id, None)
+
+        row = self.rows.get(cat_id)
+        if row is not None:
+            self.adopted[row] = count > 0
+
+    def _user_preferences(self, user_id: int):
+        return self.preferences.setdefault(user_id, (set(), set()))
+
+    def apply(self, changes: list):
+        with self.lock:
+            for kind, key, value, added in changes:
+                if kind == "cat":
+                    if added:
+                        self._add_cat(key)
+                    else:
+                        self._remove_cat(key)
+                elif kind == "cat_color":
+                    if added or key in self.rows:
+                        self._set_trait("colors", key, value, int(added))
+                elif kind == "cat_personality":
+                    if added or key in self.rows:
+                        self._set_trait("personalities", key, value, int(added))
+                elif kind == "adoption":
+                    self._set_adopted(key, added)
+                elif kind in ("color_preference", "personality_preference"):
+                    prefs = self._user_preferences(key)[kind == "personality_preference"]
+                    if added:
+                        prefs.add(value)
+                    else:
+                        prefs.discard(value)
+
+    # RANKING =====================================================================================
+
+    def _columns(self, matrix: np.ndarray, trait_ids):
+        return [trait_id for trait_id in trait_ids if trait_id < matrix.shape[1]]
+
+    def top_k(self, user_id: int, k: int):
+        """
+        Returns up to `k` (cat_id, score) pairs for unadopted cats, best match
+        first. The score is the number of the user's preferred colors and
+        personalities the cat has; ties go to the cat registered first.
+        """
+        with self.lock:
+            n = self.size
+            color_ids, personality_ids = self.preferences.get(user_id, (set(), set()))
+
+            scores = np.zeros(n, dtype=np.int32)
+            color_cols = self._columns(self.colors, color_ids)
+            if color_cols:
+                scores += self.colors[:n, color_cols].sum(axis=1, dtype=np.int32)
+            personality_cols = self._columns(self.personalities, personality_ids)
+            if personality_cols:
+                scores += self.personalities[:n, personality_cols].sum(axis=1, dtype=np.int32)
+
+            candidates = np.flatnonzero(self.active[:n] & ~self.adopted[:n])
+            if len(candidates) > k:
+                # Rows are appended as cats are created, so a smaller row is an older cat.
+                keys = scores[candidates].astype(np.int64) * (n + 1) + (n - candidates)
+                candidates = candidates[np.argpartition(-keys, k - 1)[:k]]
+
+            order = np.lexsort((candidates, -scores[candidates]))
+            best = candidates[order]
+            return list(zip(self.cat_ids[best].tolist(), scores[best].tolist()))
+
+
+index = MatchIndex()
+
+# ORM SYNCHRONIZATION =============================================================================
+
+def _previous_status(obj: models.Adoption):
+    return stats.previous_value(obj, "status")
+
+def _describe(obj, added: bool):
+    if isinstance(obj, models.Cat):
+        return ("cat", obj.id, None, added)
+    if isinstance(obj, models.CatColor):
+        return ("cat_color", obj.cat_id, obj.color_id, added)
+    if isinstance(obj, models.CatPersonality):
+        return ("cat_personality", obj.cat_id, obj.personality_id, added)
+    if isinstance(obj, models.Adoption):
+        # Only active adoptions hide a cat; for a deleted row, the status it had counts.
+        status = obj.status if added else _previous_status(obj)
+        return ("adoption", obj.cat_id, None, added) if status in models.ADOPTION_ACTIVE_STATUSES else None
+    if isinstance(obj, models.ColorPreference):
+        return ("color_preference", obj.user_id, obj.color_id, added)
+    if isinstance(obj, models.PersonalityPreference):
+        return ("personality_preference", obj.user_id, obj.personality_id, added)
+    return None
+
+@event.listens_for(Session, "after_flush")
+def _collect_changes(session: Session, flush_context):
+    if not index.ready:
+        return
+
+    changes = session.info.setdefault("match_changes", [])
+    for objects, added in ((session.new, True), (session.deleted, False)):
+        for obj in objects:
+            change = _describe(obj, added)
+            if change is not None:
+                changes.append(change)
+
+    # A status change moves an adoption in or out of the active set.
+    for obj in session.dirty:
+        if isinstance(obj, models.Adoption):
+            was_active = _previous_status(obj) in models.ADOPTION_ACTIVE_STATUSES
+            is_active = obj.status in models.ADOPTION_ACTIVE_STATUSES
+            if was_active != is_active:
+                changes.append(("adoption", obj.cat_id, None, is_active))
+
+@event.listens_for(Session, "after_commit")
+def _apply_changes(session: Session):
+    changes = session.info.pop("match_changes", None)
+    if changes:
+        index.apply(changes)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session: Session):
+    session.info.pop("match_changes", None)
+
+@preferences_changed.subscribe
+def _apply_preference_changes(user_id: int, changes: list):
+    # Preference replacement writes through Core, bypassing the events above.
+    index.apply(changes)
@@ -0,0 +1,39 @@
+import asyncio
+from contextlib import contextmanager
+
+SUBSCRIBER_QUEUE_SIZE = 100
+
+class Broker:
+    """
+    In-process pub/sub fan-out of new messages to connected receivers.
+
+    Each subscriber gets a bounded queue; a subscriber that falls behind loses
+    its oldest pending messages instead of slowing down the sender. Delivery is
+    per worker process, so a receiver only hears about messages sent through the
+    worker its socket is connected to.
+    """
+
+    def __init__(self):
+        self.subscribers: dict[int, set[asyncio.Queue]] = {}
+
+    @contextmanager
+    def subscribe(self, user_id: int):
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers.setdefault(user_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            queues = self.subscribers.get(user_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    del self.subscribers[user_id]
+
+    def publish(self, user_id: int, payload):
+        for queue in self.subscribers.get(user_id, ()):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(payload)
+
+
+broker = Broker()
@@ -0,0 +1,168 @@
+"""
+Request latency, SQL query and connection pool metrics in the Prometheus text
+exposition format.
+
+`MetricsMiddleware` times every HTTP request by route template and attaches a
+per-request query counter that the SQLAlchemy engine events below fill in.
+"""
+from bisect import bisect_left
+from contextvars import ContextVar
+from time import perf_counter
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+def _format_labels(labels: dict):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels.items()) + "}"
+
+class Histogram:
+    def __init__(self, name: str, help: str, buckets: tuple):
+        self.name = name
+        self.help = help
+        self.buckets = buckets
+        self.series = {}
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.items())
+        series = self.series.get(key)
+
+        if series is None:
+            series = self.series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+
+        for key, (counts, total, count) in self.series.items():
+            labels = dict(key)
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': bound})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+
+        return lines
+
+def render_samples(name: str, help: str, kind: str, samples: list[tuple[dict, float]]):
+    lines = [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+    lines += [f"{name}{_format_labels(labels)} {value}" for labels, value in samples]
+    return lines
+
+
+request_latency = Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", LATENCY_BUCKETS,
+)
+request_queries = Histogram(
+    "db_queries_per_request", "SQL statements executed per HTTP request.", QUERY_COUNT_BUCKETS,
+)
+request_query_time = Histogram(
+    "db_query_duration_per_request_seconds", "Time spent in SQL per HTTP request.", LATENCY_BUCKETS,
+)
+
+# QUERY COUNTING ==================================================================================
+
+class QueryStats:
+    __slots__ = ("count", "duration")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+# Set by the middleware for the duration of a request; None outside requests.
+current_query_stats: ContextVar[QueryStats | None] = ContextVar("current_query_stats", default=None)
+
+# Connection pool usage per engine, tracked from pool events so it works for any pool class.
+pool_usage: dict[str, dict[str, int]] = {}
+
+def instrument_engine(engine: Engine, name: str):
+    usage = pool_usage.setdefault(name, {"checked_out": 0, "checkouts": 0, "connects": 0})
+
+    @event.listens_for(engine, "connect")
+    def _connect(dbapi_connection, connection_record):
+        usage["connects"] += 1
+
+    @event.listens_for(engine, "checkout")
+    def _checkout(dbapi_connection, connection_record, connection_proxy):
+        usage["checked_out"] += 1
+        usage["checkouts"] += 1
+
+    @event.listens_for(engine, "checkin")
+    def _checkin(dbapi_connection, connection_record):
+        usage["checked_out"] -= 1
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _start_query(conn, cursor, statement, parameters, context, executemany):
+        context.metrics_started = perf_counter()
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _end_query(conn, cursor, statement, parameters, context, executemany):
+        stats = current_query_stats.get()
+
+        if stats is not None:
+            stats.count += 1
+            stats.duration += perf_counter() - context.metrics_started
+
+# MIDDLEWARE ======================================================================================
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        stats = QueryStats()
+        token = current_query_stats.set(stats)
+        status_code = 500
+        started = perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            current_query_stats.reset(token)
+
+            # The route template keeps label cardinality bounded (/cat, not /cat?id=42).
+            route = scope.get("route")
+            labels = {"method": scope["method"], "route": route.path if route else "unmatched"}
+
+            request_latency.observe(perf_counter() - started, **labels, status=status_code)
+            request_queries.observe(stats.count, **labels)
+            request_query_time.observe(stats.duration, **labels)
+
+# EXPOSITION ======================================================================================
+
+def render(extra: list[str] = ()):
+    lines = []
+    for histogram in (request_latency, request_queries, request_query_time):
+        lines += histogram.render()
+
+    lines += render_samples(
+        "db_pool_checked_out", "Connections currently checked out of the pool.", "gauge",
+        [({"engine": name}, usage["checked_out"]) for name, usage in pool_usage.items()],
+    )
+    lines += render_samples(
+        "db_pool_checkouts_total", "Connections handed out by the pool.", "counter",
+        [({"engine": name}, usage["checkouts"]) for name, usage in pool_usage.items()],
+    )
+    lines += render_samples(
+        "db_pool_connects_total", "New DBAPI connections opened.", "counter",
+        [({"engine": name}, usage["connects"]) for name, usage in pool_usage.items()],
+    )
+    lines += extra
+
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,173 @@
+"""
+Versioned schema migrations.
+
+The schema version is the highest version recorded in `schema_migrations`.
+Migrations run once per deployment, before the API starts, with:
+
+    python -m core.migrations upgrade
+
+An empty database gets the current models through `create_all` and is stamped
+with the latest version. A database created before this runner existed (it
+has tables but no `schema_migrations`) is stamped as version 1, the original
+schema, and upgraded from there.
+
+Workers only compare the stored version with `SCHEMA_VERSION` at startup (one
+indexed read) and refuse to start on a mismatch. They never issue DDL.
+
+New migrations are appended to `MIGRATIONS` with the next version and must
+describe the change explicitly, since `create_all` already produces the latest
+schema for new databases.
+"""
+import argparse
+from datetime import datetime
+from sqlalchemy import Column, Connection, DateTime, Engine, Integer, MetaData, String, Table, func, inspect, select, text
+from . import models, rescues, search, stats
+
+_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations",
+    _metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200)),
+    Column("applied_datetime", DateTime),
+)
+
+MIGRATIONS = []
+
+def migration(version: int, description: str):
+    def register(upgrade):
+        MIGRATIONS.append((version, description, upgrade))
+        return upgrade
+    return register
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+# MIGRATIONS ======================================================================================
+
+@migration(1, "Original schema")
+def _original_schema(conn: Connection):
+    # Only reached by stamping: databases that predate the runner already have it.
+    pass
+
+@migration(2, "Widen users.pass_salt and users.pass_hash for KDF hashes")
+def _widen_password_columns(conn: Connection):
+    # SQLite does not enforce column lengths.
+    if conn.dialect.name == "mysql":
+        conn.execute(text("ALTER TABLE users MODIFY pass_salt CHAR(32), MODIFY pass_hash VARCHAR(255)"))
+
+@migration(3, "Listing, inbox, queue and scheduler indexes; unique cat names and active adoptions")
+def _add_indexes(conn: Connection):
+    for index in (
+        *models.Cat.__table__.indexes,
+        *models.CatColor.__table__.indexes,
+        *models.CatPersonality.__table__.indexes,
+        *models.Rescue.__table__.indexes,
+        *models.Adoption.__table__.indexes,
+        *models.Message.__table__.indexes,
+        *models.Vaccination.__table__.indexes,
+    ):
+        index.create(conn, checkfirst=True)
+
+@migration(4, "Job watermarks and open-rescue region counts")
+def _add_summary_tables(conn: Connection):
+    models.JobWatermark.__table__.create(conn, checkfirst=True)
+    models.RescueRegionCount.__table__.create(conn, checkfirst=True)
+    rescues.rebuild(conn)
+
+@migration(5, "Full-text cat search documents")
+def _add_search_table(conn: Connection):
+    search.create_table(conn)
+    search.rebuild(conn)
+
+@migration(6, "Shelter statistics counters")
+def _add_stat_counters(conn: Connection):
+    models.StatCounter.__table__.create(conn, checkfirst=True)
+    stats.rebuild(conn)
+
+@migration(7, "Preference lookup indexes by user")
+def _add_preference_indexes(conn: Connection):
+    for index in (*models.ColorPreference.__table__.indexes, *models.PersonalityPreference.__table__.indexes):
+        index.create(conn, checkfirst=True)
+
+@migration(8, "System sender lookup index by user role")
+def _add_user_role_index(conn: Connection):
+    for index in models.User.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+@migration(9, "Open-rescue queue indexes by request time and by zipcode in queue order")
+def _add_rescue_queue_indexes(conn: Connection):
+    # Replaced by ix_rescues_status_zipcode_requested, which also orders by user id.
+    if "ix_rescues_status_zipcode" in {index["name"] for index in inspect(conn).get_indexes("rescues")}:
+        on_table = " ON rescues" if conn.dialect.name == "mysql" else ""
+        conn.execute(text(f"DROP INDEX ix_rescues_status_zipcode{on_table}"))
+    for index in models.Rescue.__table__.indexes:
+        index.create(conn, checkfirst=True)
+
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+# RUNNER ==========================================================================================
+
+def current_version(conn: Connection):
+    """The stored schema version, or None when the database has never been migrated."""
+    if not inspect(conn).has_table(schema_migrations.name):
+        return None
+    return conn.scalar(select(func.max(schema_migrations.c.version)))
+
+def check_schema_version(conn: Connection):
+    version = current_version(conn)
+    if version != SCHEMA_VERSION:
+        raise SchemaVersionError(
+            f"Database schema version is {version}, this code expects {SCHEMA_VERSION}. "
+            "Run 'python -m core.migrations upgrade' first."
+        )
+
+def _record(conn: Connection, version: int, description: str):
+    conn.execute(
+        schema_migrations.insert().values(version=version, description=description, applied_datetime=datetime.now())
+    )
+
+def upgrade(engine: Engine):
+    """Brings the database to `SCHEMA_VERSION` and returns the versions applied."""
+    with engine.begin() as conn:
+        version = current_version(conn)
+
+        if version is None:
+            legacy = inspect(conn).has_table(models.User.__tablename__)
+            schema_migrations.create(conn)
+
+            if not legacy:
+                models.Base.metadata.create_all(conn)
+                for version, description, _ in MIGRATIONS:
+                    _record(conn, version, description)
+                return [version for version, _, _ in MIGRATIONS]
+
+            version, description, _ = MIGRATIONS[0]
+            _record(conn, version, description)
+
+    applied = []
+    for pending, description, upgrade_schema in MIGRATIONS:
+        if pending <= version:
+            continue
+        # One transaction per migration (DDL is transactional on SQLite, not on MySQL).
+        with engine.begin() as conn:
+            upgrade_schema(conn)
+            _record(conn, pending, description)
+        applied.append(pending)
+
+    return applied
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migrações do esquema do banco de dados.")
+    parser.add_argument("command", choices=["upgrade", "current"])
+    args = parser.parse_args()
+
+    from .database import engine
+
+    if args.command == "upgrade":
+        applied = upgrade(engine)
+        print(f"Versões aplicadas: {applied}." if applied else "Nenhuma migração pendente.")
+
+    with engine.connect() as conn:
+        print(f"Versão do esquema: {current_version(conn)} (esperada: {SCHEMA_VERSION}).")
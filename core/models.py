@@ -1,6 +1,6 @@
 from typing import Optional, Set
 from datetime import date, datetime
-from sqlalchemy import Integer, Date, DateTime, String, CHAR, UniqueConstraint, ForeignKey, SmallInteger
+from sqlalchemy import BigInteger, Integer, Date, DateTime, String, CHAR, UniqueConstraint, ForeignKey, SmallInteger, Index
 from sqlalchemy.orm import Mapped, relationship, mapped_column
 
 from .database import Base
@@ -13,14 +13,16 @@ class User(Base):
     username : Mapped[str] = mapped_column(String(20))
     date_birth : Mapped[date] = mapped_column(Date)
     datetime_register : Mapped[date] = mapped_column(DateTime)
-    pass_salt : Mapped[str] = mapped_column(CHAR(16))
-    pass_hash : Mapped[str] = mapped_column(CHAR(64))
+    pass_salt : Mapped[str] = mapped_column(CHAR(32))
+    pass_hash : Mapped[str] = mapped_column(String(255))
     role : Mapped[str] = mapped_column(String(10))
     contact_email : Mapped[Optional[str]] = mapped_column(String(50))
     contact_phone : Mapped[str] = mapped_column(CHAR(11))
 
     __table_args__ = (
         UniqueConstraint("username"),
+        # The reminder job finds its system sender by role.
+        Index("ix_users_role", "role"),
     )
 
     color_preferences : Mapped[Optional[Set["ColorPreference"]]] = relationship(
@@ -64,10 +66,24 @@ class Cat(Base):
     age : Mapped[int] = mapped_column(SmallInteger)
     sex : Mapped[str] = mapped_column(CHAR(1))
 
-    adoption : Mapped[Optional["Adoption"]] = relationship(
+    # Listing filters are keyset-paginated on id, so every filter index ends with it.
+    __table_args__ = (
+        Index("uq_cats_name", "name", unique=True),
+        Index("ix_cats_sex_id", "sex", "id"),
+        Index("ix_cats_age_id", "age", "id"),
+    )
+
+    # Every adoption request, cancelled ones included, so deleting a cat removes its whole history.
+    adoptions : Mapped[Optional[Set["Adoption"]]] = relationship(
         back_populates="cat", cascade="all, delete-orphan",
     )
 
+    # The pending or completed adoption, if any; cancelled ones are only history.
+    active_adoption : Mapped[Optional["Adoption"]] = relationship(
+        primaryjoin=lambda: (Cat.id == Adoption.cat_id) & Adoption.status.in_(ADOPTION_ACTIVE_STATUSES),
+        viewonly=True,
+    )
+
     vaccinations : Mapped[Optional[Set["Vaccination"]]] = relationship(
         back_populates="cat", cascade="all, delete-orphan",
     )
@@ -195,6 +211,10 @@ class CatColor(Base):
     cat_id : Mapped[int] = mapped_column(ForeignKey("cats.id"), primary_key=True)
     color_id : Mapped[int] = mapped_column(ForeignKey("colors.id"), primary_key=True)
 
+    __table_args__ = (
+        Index("ix_cat_colors_color_cat", "color_id", "cat_id"),
+    )
+
     cat : Mapped["Cat"] = relationship(back_populates="cat_colors")
     color : Mapped["Color"] = relationship(back_populates="cat_colors")
 
@@ -213,6 +233,10 @@ class CatPersonality(Base):
     cat_id : Mapped[int] = mapped_column(ForeignKey("cats.id"), primary_key=True)
     personality_id : Mapped[int] = mapped_column(ForeignKey("personalities.id"), primary_key=True)
 
+    __table_args__ = (
+        Index("ix_cat_personalities_personality_cat", "personality_id", "cat_id"),
+    )
+
     cat : Mapped["Cat"] = relationship(
         back_populates="cat_personalities",
     )
@@ -263,6 +287,11 @@ class ColorPreference(Preference):
 
     color_id : Mapped[int] = mapped_column(ForeignKey("colors.id"), primary_key=True)
 
+    # The primary key leads with color_id, but preferences are read per user.
+    __table_args__ = (
+        Index("ix_color_preferences_user_color", "user_id", "color_id"),
+    )
+
     user : Mapped["User"] = relationship(back_populates="color_preferences")
     color : Mapped["Color"] = relationship(back_populates="color_preferences")
 
@@ -283,6 +312,10 @@ class PersonalityPreference(Preference):
 
     personality_id : Mapped[int] = mapped_column(ForeignKey("personalities.id"), primary_key=True)
 
+    __table_args__ = (
+        Index("ix_personality_preferences_user_personality", "user_id", "personality_id"),
+    )
+
     user : Mapped["User"] = relationship(back_populates="personality_preferences")
     personality : Mapped["Personality"] = relationship(back_populates="personality_preferences")
 
@@ -312,6 +345,13 @@ class Rescue(Base):
     addr_number : Mapped[int] = mapped_column(Integer)
     addr_zipcode : Mapped[str] = mapped_column(CHAR(8)) # CEP
 
+    # Queue pages seek on (status, city) or a zipcode range and walk request_datetime.
+    __table_args__ = (
+        Index("ix_rescues_status_city_requested", "status", "addr_city", "request_datetime", "user_id"),
+        Index("ix_rescues_status_zipcode_requested", "status", "addr_zipcode", "request_datetime", "user_id"),
+        Index("ix_rescues_status_requested", "status", "request_datetime", "user_id"),
+    )
+
     user : Mapped["User"] = relationship(back_populates="rescues")
 
     def __repr__(self):
@@ -329,6 +369,27 @@ class Rescue(Base):
         """
 
 
+class RescueRegionCount(Base):
+    __tablename__ = "rescue_region_counts"
+
+    addr_state : Mapped[str] = mapped_column(String(100), primary_key=True)
+    addr_city : Mapped[str] = mapped_column(String(50), primary_key=True)
+    open_count : Mapped[int] = mapped_column(Integer)
+
+    def __repr__(self):
+        return f"""
+        RescueRegionCount (
+            addr_state={self.addr_state!r},
+            addr_city={self.addr_city!r},
+            open_count={self.open_count!r}
+        )
+        """
+
+
+ADOPTION_STATUS_PENDING = "pendente"
+ADOPTION_STATUS_COMPLETED = "concluída"
+ADOPTION_ACTIVE_STATUSES = (ADOPTION_STATUS_PENDING, ADOPTION_STATUS_COMPLETED)
+
 class Adoption(Base):
     __tablename__ = "adoptions"
 
@@ -338,8 +399,20 @@ class Adoption(Base):
     hand_over_datetime : Mapped[Optional[datetime]] = mapped_column(DateTime)
     status : Mapped[str] = mapped_column(String(20))
 
+    # A cat has at most one active adoption. MySQL has no partial indexes, so
+    # there the rule is not enforced by the database.
+    __table_args__ = (
+        Index("ix_adoptions_cat_status", "cat_id", "status"),
+        Index(
+            "ux_adoptions_active_cat", "cat_id",
+            unique=True,
+            sqlite_where=status.in_(ADOPTION_ACTIVE_STATUSES),
+            postgresql_where=status.in_(ADOPTION_ACTIVE_STATUSES),
+        ).ddl_if(dialect=("sqlite", "postgresql")),
+    )
+
     user : Mapped["User"] = relationship(back_populates="adoptions")
-    cat : Mapped["Cat"] = relationship(back_populates="adoption")
+    cat : Mapped["Cat"] = relationship(back_populates="adoptions")
 
     def __repr__(self):
         return f"""
@@ -379,6 +452,11 @@ class Message(Base):
     content : Mapped[str] = mapped_column(String(2000))
     status : Mapped[str] = mapped_column(String(20))
 
+    # Inbox pages seek on (receiver_id, sent_datetime); conversations also use the primary key.
+    __table_args__ = (
+        Index("ix_messages_receiver_sent", "receiver_id", "sent_datetime", "sender_id"),
+    )
+
     sender : Mapped["User"] = relationship(backref="sent_messages", foreign_keys=[sender_id])
     receiver : Mapped["User"] = relationship(backref="received_messages", foreign_keys=[receiver_id])
 
@@ -401,6 +479,11 @@ class Vaccination(Base):
     dose : Mapped[str] = mapped_column(CHAR(3))
     appl_date : Mapped[date] = mapped_column(Date)
     next_date : Mapped[Optional[date]] = mapped_column(Date)
+
+    # The reminder scheduler range-scans due doses by next_date.
+    __table_args__ = (
+        Index("ix_vaccinations_next_date", "next_date", "cat_id", "vaccine_id"),
+    )
     
     cat : Mapped["Cat"] = relationship(back_populates="vaccinations")
     vaccine : Mapped["Vaccine"] = relationship(back_populates="vaccinations")
@@ -415,3 +498,37 @@ class Vaccination(Base):
             next_datetime={self.next_datetime!r}
         )
         """
+
+
+class JobWatermark(Base):
+    __tablename__ = "job_watermarks"
+
+    job : Mapped[str] = mapped_column(String(50), primary_key=True)
+    watermark : Mapped[date] = mapped_column(Date)
+    updated_datetime : Mapped[datetime] = mapped_column(DateTime)
+
+    def __repr__(self):
+        return f"""
+        JobWatermark (
+            job={self.job!r},
+            watermark={self.watermark!r},
+            updated_datetime={self.updated_datetime!r}
+        )
+        """
+
+
+class StatCounter(Base):
+    __tablename__ = "stat_counters"
+
+    name : Mapped[str] = mapped_column(String(50), primary_key=True)
+    key : Mapped[str] = mapped_column(String(50), primary_key=True)
+    value : Mapped[int] = mapped_column(BigInteger)
+
+    def __repr__(self):
+        return f"""
+        StatCounter (
+            name={self.name!r},
+            key={self.key!r},
+            value={self.value!r}
+        )
+        """
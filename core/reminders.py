@@ -0,0 +1,184 @@
+"""
+Vaccination reminders.
+
+Each pass finds every dose whose `next_date` falls in (watermark, today + lead
+days] with one range scan on `ix_vaccinations_next_date`, groups the doses by
+the user who adopted each cat and enqueues one reminder `Message` per adopter
+through batched multi-row inserts.
+
+The first pass, with no watermark yet, starts VACCINATION_REMINDER_GRACE_DAYS
+before today instead of reminding about every dose that was ever overdue.
+
+The watermark advances in the same transaction as the inserts, so a pass is all
+or nothing: a crashed pass is simply redone by the next one, and a pass that
+finds the watermark already moved by another worker rolls back without sending.
+
+The API runs a pass every VACCINATION_REMINDER_INTERVAL_IN_SECONDS (0 disables
+it); a single pass can also be run with:
+
+    python -m core.reminders
+"""
+import asyncio
+import logging
+import secrets
+from datetime import date, datetime, timedelta
+from itertools import groupby
+from os import getenv
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import messaging, models, schemas, security
+from .crud import MESSAGE_STATUS_SENT
+from .database import AsyncSessionLocal
+
+VACCINATION_REMINDER_LEAD_DAYS = int(getenv("VACCINATION_REMINDER_LEAD_DAYS", "7"))
+VACCINATION_REMINDER_INTERVAL_IN_SECONDS = int(getenv("VACCINATION_REMINDER_INTERVAL_IN_SECONDS", "3600"))
+VACCINATION_REMINDER_BATCH_SIZE = int(getenv("VACCINATION_REMINDER_BATCH_SIZE", "1000"))
+VACCINATION_REMINDER_GRACE_DAYS = int(getenv("VACCINATION_REMINDER_GRACE_DAYS", "0"))
+REMINDER_SENDER_USERNAME = getenv("REMINDER_SENDER_USERNAME", "purrfect")
+
+# Reserved: `POST /user` refuses this role and the sender username, so the
+# sender cannot be impersonated by registering first.
+SYSTEM_ROLE = "system"
+
+JOB_NAME = "vaccination_reminders"
+MESSAGE_MAX_LENGTH = 2000
+
+logger = logging.getLogger(__name__)
+
+async def _sender_id(db: AsyncSession):
+    """Id of the system user reminders are sent from, created on first use with a password nobody knows."""
+    sender_id = await db.scalar(
+        select(models.User.id).where(models.User.role == SYSTEM_ROLE).order_by(models.User.id).limit(1)
+    )
+    if sender_id is not None:
+        return sender_id
+
+    # Databases from before the name was reserved may already have a person called that.
+    username = REMINDER_SENDER_USERNAME
+    if await db.scalar(select(models.User.id).where(models.User.username == username)) is not None:
+        username = f"{username[:11]}_{secrets.token_hex(4)}"
+
+    salt = security.gen_salt()
+    sender = models.User(
+        name = "Purrfect Match",
+        username = username,
+        date_birth = date.today(),
+        datetime_register = datetime.now(),
+        pass_salt = salt,
+        pass_hash = await security.hash_password_async(salt, secrets.token_urlsafe(32)),
+        role = SYSTEM_ROLE,
+        contact_email = None,
+        contact_phone = "0" * 11,
+    )
+    db.add(sender)
+    await db.flush()
+
+    return sender.id
+
+def _due_doses_query(after: date, until: date):
+    return (
+        select(models.Adoption.user_id, models.Cat.name, models.Vaccine.name, models.Vaccination.next_date)
+        .select_from(models.Vaccination)
+        .join(models.Adoption, models.Adoption.cat_id == models.Vaccination.cat_id)
+        .join(models.Cat, models.Cat.id == models.Vaccination.cat_id)
+        .join(models.Vaccine, models.Vaccine.id == models.Vaccination.vaccine_id)
+        .where(
+            models.Vaccination.next_date > after,
+            models.Vaccination.next_date <= until,
+            models.Adoption.status == models.ADOPTION_STATUS_COMPLETED,
+        )
+        .order_by(models.Adoption.user_id, models.Vaccination.next_date, models.Cat.name)
+    )
+
+def _reminder_content(doses):
+    header = "Lembrete de vacinação:"
+    lines = [f"- {cat_name}: {vaccine_name} em {next_date.strftime('%d/%m/%Y')}" for cat_name, vaccine_name, next_date in doses]
+
+    content = header
+    for shown, line in enumerate(lines):
+        # Leave room for the "and N more" line when the list does not fit.
+        if len(content) + len(line) + 40 > MESSAGE_MAX_LENGTH:
+            return f"{content}\n... e mais {len(lines) - shown} doses."
+        content = f"{content}\n{line}"
+
+    return content
+
+async def _advance_watermark(db: AsyncSession, previous: date | None, watermark: date):
+    """Moves the watermark from `previous`; False if another pass moved it first."""
+    values = {"watermark": watermark, "updated_datetime": datetime.now()}
+
+    if previous is None:
+        db.add(models.JobWatermark(job=JOB_NAME, **values))
+        try:
+            await db.flush()
+        except IntegrityError:
+            return False
+        return True
+
+    result = await db.execute(
+        update(models.JobWatermark)
+        .where(models.JobWatermark.job == JOB_NAME, models.JobWatermark.watermark == previous)
+        .values(**values)
+    )
+    return result.rowcount == 1
+
+async def run_once(db: AsyncSession, today: date | None = None):
+    """Enqueues reminders for the doses that became due since the last pass and returns how many were sent."""
+    today = today or date.today()
+    until = today + timedelta(days=VACCINATION_REMINDER_LEAD_DAYS)
+    previous = await db.scalar(select(models.JobWatermark.watermark).where(models.JobWatermark.job == JOB_NAME))
+
+    if previous is not None and previous >= until:
+        return 0
+
+    if not await _advance_watermark(db, previous, until):
+        await db.rollback()
+        return 0
+
+    after = previous if previous is not None else today - timedelta(days=VACCINATION_REMINDER_GRACE_DAYS + 1)
+    rows = (await db.execute(_due_doses_query(after, until))).all()
+    sender_id = await _sender_id(db) if rows else None
+    sent_datetime = datetime.now()
+
+    messages = [
+        {
+            "sender_id": sender_id,
+            "receiver_id": user_id,
+            "sent_datetime": sent_datetime,
+            "content": _reminder_content(doses[1:] for doses in user_doses),
+            "status": MESSAGE_STATUS_SENT,
+        }
+        for user_id, user_doses in groupby(rows, key=lambda row: row[0])
+    ]
+
+    for start in range(0, len(messages), VACCINATION_REMINDER_BATCH_SIZE):
+        await db.execute(insert(models.Message.__table__), messages[start:start + VACCINATION_REMINDER_BATCH_SIZE])
+
+    await db.commit()
+
+    for message in messages:
+        messaging.broker.publish(message["receiver_id"], schemas.Message(**message).model_dump(mode="json"))
+
+    return len(messages)
+
+async def run_forever(interval: float = VACCINATION_REMINDER_INTERVAL_IN_SECONDS):
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                sent = await run_once(db)
+            logger.info("sent %d vaccination reminders", sent)
+        except Exception:
+            logger.exception("vaccination reminder pass failed")
+
+        await asyncio.sleep(interval)
+
+async def _main():
+    from .migrations import check_schema_version
+
+    async with AsyncSessionLocal() as db:
+        await (await db.connection()).run_sync(check_schema_version)
+        print(f"{await run_once(db)} lembretes enviados.")
+
+if __name__ == "__main__":
+    asyncio.run(_main())
@@ -0,0 +1,95 @@
+"""
+Open-rescue counts per region.
+
+`rescue_region_counts` holds how many rescues are open in each (state, city).
+It is kept current from the ORM flush events below, in the same transaction as
+the rescue writes, so dashboards read a handful of summary rows instead of
+grouping the rescues table. Core writes to `rescues` bypass the events; after
+one (or to repair drift), recompute the counts with:
+
+    python -m core.rescues rebuild
+"""
+import argparse
+from collections import Counter
+from sqlalchemy import Connection, delete, event, func, inspect, insert, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from . import models
+
+RESCUE_STATUS_OPEN = "aberto"
+
+_counts = models.RescueRegionCount.__table__
+
+def _add_to_counts(conn: Connection, deltas: Counter):
+    rows = [
+        {"addr_state": state, "addr_city": city, "open_count": delta}
+        for (state, city), delta in deltas.items() if delta
+    ]
+    if not rows:
+        return
+
+    if conn.dialect.name == "mysql":
+        statement = mysql_insert(_counts)
+        statement = statement.on_duplicate_key_update(open_count=_counts.c.open_count + statement.inserted.open_count)
+    else:
+        statement = sqlite_insert(_counts)
+        statement = statement.on_conflict_do_update(
+            index_elements=[_counts.c.addr_state, _counts.c.addr_city],
+            set_={"open_count": _counts.c.open_count + statement.excluded.open_count},
+        )
+
+    conn.execute(statement, rows)
+
+def rebuild(conn: Connection):
+    conn.execute(delete(_counts))
+    conn.execute(
+        insert(_counts).from_select(
+            ["addr_state", "addr_city", "open_count"],
+            select(models.Rescue.addr_state, models.Rescue.addr_city, func.count())
+            .where(models.Rescue.status == RESCUE_STATUS_OPEN)
+            .group_by(models.Rescue.addr_state, models.Rescue.addr_city),
+        )
+    )
+    return conn.scalar(select(func.count()).select_from(_counts))
+
+# ORM SYNCHRONIZATION =============================================================================
+
+def _previous(obj: models.Rescue, key: str):
+    history = inspect(obj).attrs[key].history
+    return history.deleted[0] if history.deleted else getattr(obj, key)
+
+def _region_deltas(session: Session):
+    deltas = Counter()
+
+    for obj in session.new:
+        if isinstance(obj, models.Rescue) and obj.status == RESCUE_STATUS_OPEN:
+            deltas[obj.addr_state, obj.addr_city] += 1
+
+    for obj in (*session.dirty, *session.deleted):
+        if not isinstance(obj, models.Rescue):
+            continue
+        if _previous(obj, "status") == RESCUE_STATUS_OPEN:
+            deltas[_previous(obj, "addr_state"), _previous(obj, "addr_city")] -= 1
+        if obj not in session.deleted and obj.status == RESCUE_STATUS_OPEN:
+            deltas[obj.addr_state, obj.addr_city] += 1
+
+    return deltas
+
+@event.listens_for(Session, "after_flush")
+def _update_region_counts(session: Session, flush_context):
+    deltas = _region_deltas(session)
+    if any(deltas.values()):
+        _add_to_counts(session.connection(), deltas)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manutenção dos contadores de resgates abertos.")
+    parser.add_argument("command", choices=["rebuild"])
+    args = parser.parse_args()
+
+    from .database import engine
+    from .migrations import check_schema_version
+
+    with engine.begin() as conn:
+        check_schema_version(conn)
+        print(f"{rebuild(conn)} regiões com resgates abertos.")
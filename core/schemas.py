@@ -1,6 +1,6 @@
 from datetime import date, datetime
 from typing import Optional
-from pydantic import BaseModel, ConfigDict
+from pydantic import BaseModel, ConfigDict, Field
 
 # USER ============================================================================================
 class UserBase(BaseModel):
@@ -19,6 +19,48 @@ class User(UserBase):
     model_config = ConfigDict(from_attributes=True)
     id : int
 
+class UserSnapshot(User):
+    """Detached, read-only copy of a user row, safe to share between requests."""
+    model_config = ConfigDict(from_attributes=True, frozen=True)
+
+BATCH_MAX_IDS = 1000
+
+class BatchRequest(BaseModel):
+    ids : list[int] = Field(min_length=1, max_length=BATCH_MAX_IDS)
+
+class UserBatch(BaseModel):
+    items : list[User]
+    missing : list[int]
+
+class Preferences(BaseModel):
+    colors : list[int] = Field(max_length=100)
+    personalities : list[int] = Field(max_length=100)
+
+# REFERENCE DATA ==================================================================================
+class Color(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    id : int
+    name : str
+
+class Personality(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    id : int
+    name : str
+    description : str
+
+class Disease(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    id : int
+    name : str
+    description : Optional[str]
+
+class Vaccine(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    id : int
+    name : str
+    description : Optional[str]
+    disease_id : int
+
 # CAT =============================================================================================
 class CatBase(BaseModel):
     name : str
@@ -32,3 +74,161 @@ class Cat(CatBase):
     model_config = ConfigDict(from_attributes=True)
     id : int
     
+
+class CatBatch(BaseModel):
+    items : list[Cat]
+    missing : list[int]
+
+class CatFilters(BaseModel):
+    sex : Optional[str] = None
+    min_age : Optional[int] = None
+    max_age : Optional[int] = None
+    color_id : Optional[int] = None
+    personality_id : Optional[int] = None
+    adopted : Optional[bool] = None
+
+class VaccinationCreate(BaseModel):
+    vaccine_id : int
+    dose : str
+    appl_date : date
+    next_date : Optional[date] = None
+
+class CatImport(CatCreate):
+    colors : list[int] = []
+    personalities : list[int] = []
+    vaccinations : list[VaccinationCreate] = []
+    physical_description : Optional[str] = None
+
+class ImportRowError(BaseModel):
+    row : int
+    error : str
+
+class ImportResult(BaseModel):
+    rows : int
+    created : int
+    errors : list[ImportRowError]
+
+class CatPage(BaseModel):
+    items : list[Cat]
+    next_cursor : Optional[int]
+
+class CatSearchResult(Cat):
+    rank : float
+
+class CatSearchPage(BaseModel):
+    items : list[CatSearchResult]
+    next_offset : Optional[int]
+
+class CatMatch(Cat):
+    score : int
+
+class Vaccination(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    vaccine : Vaccine
+    dose : str
+    appl_date : date
+    next_date : Optional[date]
+
+class Adoption(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    user_id : int
+    request_datetime : datetime
+    hand_over_datetime : Optional[datetime]
+    status : str
+
+class AdoptionCreate(BaseModel):
+    cat_id : int
+
+class CatProfile(Cat):
+    colors : list[Color]
+    personalities : list[Personality]
+    diseases : list[Disease]
+    vaccinations : list[Vaccination]
+    physical_description : Optional[str]
+    adoption : Optional[Adoption]
+
+class CatProfilePage(BaseModel):
+    items : list[CatProfile]
+    next_cursor : Optional[int]
+
+# RESCUE ==========================================================================================
+class RescueCreate(BaseModel):
+    description : str = Field(max_length=1024)
+    addr_city : str = Field(max_length=50)
+    addr_state : str = Field(max_length=100)
+    addr_street : str = Field(max_length=100)
+    addr_number : int
+    addr_zipcode : str = Field(pattern=r"^\d{8}$")
+
+class Rescue(RescueCreate):
+    model_config = ConfigDict(from_attributes=True)
+    user_id : int
+    request_datetime : datetime
+    status : str
+
+class RescuePage(BaseModel):
+    items : list[Rescue]
+    next_cursor : Optional[str]
+
+class RegionOpenCount(BaseModel):
+    addr_state : str
+    addr_city : Optional[str] = None
+    open_count : int
+
+class RescueDashboard(BaseModel):
+    states : list[RegionOpenCount]
+    cities : list[RegionOpenCount]
+
+# VACCINATION COVERAGE ============================================================================
+class DiseaseCoverage(BaseModel):
+    disease_id : int
+    name : str
+    at_risk : int
+    covered : int
+    ratio : Optional[float]
+
+class UncoveredPair(BaseModel):
+    cat_id : int
+    cat_name : str
+    disease_id : int
+    disease_name : str
+
+class CoverageReport(BaseModel):
+    as_of : date
+    diseases : list[DiseaseCoverage]
+    uncovered : list[UncoveredPair]
+    next_cursor : Optional[str]
+
+# STATS ===========================================================================================
+class DailyCount(BaseModel):
+    day : date
+    count : int
+
+class Stats(BaseModel):
+    cats_total : int
+    cats_available : int
+    cats_adopted : int
+    adoptions_by_status : dict[str, int]
+    average_handover_hours : Optional[float]
+    new_users_per_day : list[DailyCount]
+
+# MESSAGE =========================================================================================
+class MessageCreate(BaseModel):
+    receiver_id : int
+    content : str = Field(max_length=2000)
+
+class Message(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    sender_id : int
+    receiver_id : int
+    sent_datetime : datetime
+    content : str
+    status : str
+
+class MessagePage(BaseModel):
+    items : list[Message]
+    next_cursor : Optional[str]
+
+class Conversation(BaseModel):
+    user_id : int
+    last_message : Message
@@ -0,0 +1,187 @@
+"""
+Full-text search over cats.
+
+Every cat has one search document made of its name, physical description,
+color names and personality names. On SQLite the documents live in the FTS5
+table `cats_fts` (keyed by rowid = cat id) and are ranked with BM25; on MySQL
+they live in a plain `cats_fts` table with a FULLTEXT index and are ranked
+with MATCH ... AGAINST.
+
+Documents are refreshed inside the same transaction as the change that made
+them stale, from the ORM flush events below. Core bulk inserts must call
+`refresh_documents` themselves. Existing data is (re)indexed with:
+
+    python -m core.search rebuild
+"""
+import argparse
+import re
+from sqlalchemy import DDL, Connection, bindparam, event, func, select, text
+from sqlalchemy.orm import Session
+from . import models
+
+FTS_TABLE = "cats_fts"
+
+# Column weights for BM25: a hit in the name counts most, the free-text description least.
+BM25_WEIGHTS = (10.0, 1.0, 5.0, 5.0)
+
+REBUILD_BATCH_SIZE = 5000
+
+_CREATE_TABLE = {
+    "sqlite": (
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+        "name, description, colors, personalities, tokenize='unicode61 remove_diacritics 2')"
+    ),
+    "mysql": (
+        f"CREATE TABLE IF NOT EXISTS {FTS_TABLE} ("
+        "cat_id INTEGER PRIMARY KEY, name VARCHAR(50), description TEXT, colors TEXT, personalities TEXT, "
+        "FULLTEXT KEY ix_cats_fts (name, description, colors, personalities))"
+    ),
+}
+
+for dialect, statement in _CREATE_TABLE.items():
+    event.listen(models.Base.metadata, "after_create", DDL(statement).execute_if(dialect=dialect))
+
+def create_table(conn: Connection):
+    conn.execute(text(_CREATE_TABLE[conn.dialect.name]))
+
+def _key_column(conn: Connection):
+    return "rowid" if conn.dialect.name == "sqlite" else "cat_id"
+
+# INDEXING ========================================================================================
+
+def _documents_query(cat_ids: list[int] | None):
+    colors = (
+        select(func.group_concat(models.Color.name))
+        .join(models.CatColor, models.CatColor.color_id == models.Color.id)
+        .where(models.CatColor.cat_id == models.Cat.id)
+        .scalar_subquery()
+    )
+    personalities = (
+        select(func.group_concat(models.Personality.name))
+        .join(models.CatPersonality, models.CatPersonality.personality_id == models.Personality.id)
+        .where(models.CatPersonality.cat_id == models.Cat.id)
+        .scalar_subquery()
+    )
+    description = (
+        select(models.PhysicalDescription.description)
+        .where(models.PhysicalDescription.cat_id == models.Cat.id)
+        .scalar_subquery()
+    )
+
+    query = select(models.Cat.id, models.Cat.name, description, colors, personalities).order_by(models.Cat.id)
+    if cat_ids is not None:
+        query = query.where(models.Cat.id.in_(cat_ids))
+
+    return query
+
+def _write_documents(conn: Connection, rows):
+    key = _key_column(conn)
+    conn.execute(
+        text(
+            f"INSERT INTO {FTS_TABLE} ({key}, name, description, colors, personalities) "
+            "VALUES (:id, :name, :description, :colors, :personalities)"
+        ),
+        [
+            {"id": id, "name": name, "description": description, "colors": colors, "personalities": personalities}
+            for id, name, description, colors, personalities in rows
+        ],
+    )
+
+def refresh_documents(conn: Connection, cat_ids):
+    """Rebuilds the search documents of the given cats; deleted cats just lose theirs."""
+    cat_ids = list(cat_ids)
+    if not cat_ids:
+        return
+
+    conn.execute(
+        text(f"DELETE FROM {FTS_TABLE} WHERE {_key_column(conn)} IN :ids").bindparams(bindparam("ids", expanding=True)),
+        {"ids": cat_ids},
+    )
+
+    rows = conn.execute(_documents_query(cat_ids)).all()
+    if rows:
+        _write_documents(conn, rows)
+
+def rebuild(conn: Connection):
+    conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+
+    result = conn.execution_options(yield_per=REBUILD_BATCH_SIZE).execute(_documents_query(None))
+    count = 0
+    for rows in result.partitions():
+        _write_documents(conn, rows)
+        count += len(rows)
+
+    return count
+
+# ORM SYNCHRONIZATION =============================================================================
+
+def _stale_cat_ids(session: Session):
+    cat_ids = set()
+    color_ids = set()
+    personality_ids = set()
+
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, models.Cat):
+            cat_ids.add(obj.id)
+        elif isinstance(obj, (models.CatColor, models.CatPersonality, models.PhysicalDescription)):
+            cat_ids.add(obj.cat_id)
+        elif isinstance(obj, models.Color) and obj not in session.new:
+            color_ids.add(obj.id)
+        elif isinstance(obj, models.Personality) and obj not in session.new:
+            personality_ids.add(obj.id)
+
+    # A renamed color or personality changes the document of every cat that has it.
+    if color_ids:
+        cat_ids.update(session.scalars(
+            select(models.CatColor.cat_id).where(models.CatColor.color_id.in_(color_ids))
+        ))
+    if personality_ids:
+        cat_ids.update(session.scalars(
+            select(models.CatPersonality.cat_id).where(models.CatPersonality.personality_id.in_(personality_ids))
+        ))
+
+    return cat_ids
+
+@event.listens_for(Session, "after_flush")
+def _refresh_stale_documents(session: Session, flush_context):
+    cat_ids = _stale_cat_ids(session)
+    if cat_ids:
+        refresh_documents(session.connection(), cat_ids)
+
+# SEARCH ==========================================================================================
+
+def match_expression(query: str, dialect: str):
+    """
+    Turns free text into a match expression. On SQLite every word is quoted and
+    ANDed, so FTS5 syntax characters in user input are ignored.
+    """
+    words = re.findall(r"\w+", query)
+    if dialect == "sqlite":
+        return " ".join(f'"{word}"' for word in words)
+    return " ".join(words)
+
+def search_query(dialect: str):
+    if dialect == "sqlite":
+        weights = ", ".join(map(str, BM25_WEIGHTS))
+        return text(
+            f"SELECT rowid AS cat_id, bm25({FTS_TABLE}, {weights}) AS rank FROM {FTS_TABLE} "
+            f"WHERE {FTS_TABLE} MATCH :match ORDER BY rank, rowid LIMIT :limit OFFSET :offset"
+        )
+
+    return text(
+        "SELECT cat_id, -MATCH(name, description, colors, personalities) AGAINST (:match) AS rank "
+        f"FROM {FTS_TABLE} WHERE MATCH(name, description, colors, personalities) AGAINST (:match) "
+        "ORDER BY rank, cat_id LIMIT :limit OFFSET :offset"
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manutenção do índice de busca de gatos.")
+    parser.add_argument("command", choices=["rebuild"])
+    args = parser.parse_args()
+
+    from .database import engine
+    from .migrations import check_schema_version
+
+    with engine.begin() as conn:
+        check_schema_version(conn)
+        print(f"{rebuild(conn)} gatos indexados.")
@@ -1,5 +1,9 @@
+import asyncio
 from os import getenv
-from hashlib import sha256
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from hashlib import pbkdf2_hmac, scrypt, sha256
+from hmac import compare_digest
 from secrets import token_hex
 from pydantic import BaseModel
 from fastapi import HTTPException, status
@@ -11,6 +15,24 @@ ALGORITHM = "HS256"
 SECRET_KEY = getenv("JWT_KEY")
 AUTH_TOKEN_LIFETIME_IN_HOURS = 48
 
+# Shelter staff: only they read the exports, statistics and vaccination reports,
+# and the roles cannot be chosen at registration.
+STAFF_ROLES = ("admin", "vet")
+
+# Password KDF ("scrypt" or "pbkdf2_sha256") and its cost. Raising the cost makes
+# each login slower and brute forcing harder; stored hashes with other settings
+# are upgraded on the next successful login.
+PASSWORD_KDF = getenv("PASSWORD_KDF", "scrypt")
+SCRYPT_N = int(getenv("SCRYPT_N", "16384"))
+SCRYPT_R = int(getenv("SCRYPT_R", "8"))
+SCRYPT_P = int(getenv("SCRYPT_P", "1"))
+PBKDF2_ITERATIONS = int(getenv("PBKDF2_ITERATIONS", "600000"))
+
+# Hashing runs in its own thread pool (hashlib releases the GIL) so it never
+# blocks the event loop. Requests beyond the queue limit get a 503.
+PASSWORD_HASH_WORKERS = int(getenv("PASSWORD_HASH_WORKERS", "4"))
+PASSWORD_HASH_MAX_PENDING = int(getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
 CREDENTIALS_EXPIRATION_HTTPEXCEPTION = HTTPException(
     status_code=status.HTTP_401_UNAUTHORIZED,
     detail="Não foi possível validar as credenciais",
@@ -23,6 +45,17 @@ UNAUTHORIZED_HTTPEXCEPTION = HTTPException(
     headers={"WWW-Authenticate": "Bearer"},
 )
 
+FORBIDDEN_HTTPEXCEPTION = HTTPException(
+    status_code=status.HTTP_403_FORBIDDEN,
+    detail="Acesso restrito à equipe do abrigo",
+)
+
+PASSWORD_HASH_BUSY_HTTPEXCEPTION = HTTPException(
+    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+    detail="Servidor ocupado, tente novamente em instantes",
+    headers={"Retry-After": "1"},
+)
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -33,9 +66,79 @@ class TokenData(BaseModel):
 def gen_salt():
     return token_hex(16)
 
-def hash_password(salt: str, password: str):
+def _legacy_hash(password: str):
     return sha256(password.encode()).hexdigest()
 
+def _kdf_hash(kdf: str, params: list[int], salt: str, password: str):
+    if kdf == "scrypt":
+        n, r, p = params
+        return scrypt(password.encode(), salt=salt.encode(), n=n, r=r, p=p, maxmem=256 * n * r * p).hex()
+    elif kdf == "pbkdf2_sha256":
+        iterations, = params
+        return pbkdf2_hmac("sha256", password.encode(), salt.encode(), iterations).hex()
+
+    raise ValueError(f"Unknown password KDF: {kdf}")
+
+def _current_params():
+    if PASSWORD_KDF == "scrypt":
+        return [SCRYPT_N, SCRYPT_R, SCRYPT_P]
+    return [PBKDF2_ITERATIONS]
+
+def hash_password(salt: str, password: str):
+    """Returns `<kdf>$<param>$...$<hex digest>` using the configured KDF and cost."""
+    params = _current_params()
+    digest = _kdf_hash(PASSWORD_KDF, params, salt, password)
+    return "$".join([PASSWORD_KDF, *map(str, params), digest])
+
 def check_password(pass_salt: str, pass_hash: str, password: str):
-    hashed_pass = hash_password(pass_salt, password)
-    return pass_hash == hashed_pass 
\ No newline at end of file
+    if "$" not in pass_hash:
+        # Unsalted SHA-256 from before the KDF was introduced.
+        return compare_digest(pass_hash, _legacy_hash(password))
+
+    kdf, *params, digest = pass_hash.split("$")
+    return compare_digest(digest, _kdf_hash(kdf, [int(param) for param in params], pass_salt, password))
+
+@lru_cache(maxsize=None)
+def _dummy_credentials():
+    salt = gen_salt()
+    return salt, hash_password(salt, token_hex(16))
+
+def check_dummy_password(password: str):
+    """
+    Runs the KDF against a throwaway hash with the current cost and returns
+    False. Used for unknown usernames, so they take as long to reject as a
+    wrong password and response times do not reveal which usernames exist.
+    """
+    salt, pass_hash = _dummy_credentials()
+    check_password(salt, pass_hash, password)
+    return False
+
+def needs_rehash(pass_hash: str):
+    return pass_hash.split("$")[:-1] != [PASSWORD_KDF, *map(str, _current_params())]
+
+_hash_executor = ThreadPoolExecutor(max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash")
+_pending_hashes = 0
+
+async def _run_in_hash_pool(func, *args):
+    global _pending_hashes
+
+    if _pending_hashes >= PASSWORD_HASH_MAX_PENDING:
+        raise PASSWORD_HASH_BUSY_HTTPEXCEPTION
+
+    _pending_hashes += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, func, *args)
+    finally:
+        _pending_hashes -= 1
+
+def pending_hashes():
+    return _pending_hashes
+
+async def hash_password_async(salt: str, password: str):
+    return await _run_in_hash_pool(hash_password, salt, password)
+
+async def check_password_async(pass_salt: str, pass_hash: str, password: str):
+    return await _run_in_hash_pool(check_password, pass_salt, pass_hash, password)
+
+async def check_dummy_password_async(password: str):
+    return await _run_in_hash_pool(check_dummy_password, password)
@@ -0,0 +1,213 @@
+"""
+Shelter statistics for the admin dashboards.
+
+`stat_counters` holds one row per aggregate, keyed by (name, key):
+
+    cats              ""            number of cats
+    adoptions         <status>      adoptions in each status
+    handovers         ""            completed hand-overs (hand_over_datetime set)
+    handover_seconds  ""            total seconds from request to hand-over
+    users_registered  <YYYY-MM-DD>  users registered on that day
+
+It is kept current from the ORM flush events below, in the same transaction as
+the writes (previous values the identity map lacks are read before the flush),
+so `/stats` reads a few summary rows instead of counting and grouping the cats,
+adoptions and users tables. Core writes to those tables must call `add`
+themselves; after any other bulk change (or to repair drift), recompute
+everything with:
+
+    python -m core.stats rebuild
+"""
+import argparse
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import Connection, delete, event, func, inspect, insert, literal, select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from . import models
+
+CATS = "cats"
+ADOPTIONS = "adoptions"
+HANDOVERS = "handovers"
+HANDOVER_SECONDS = "handover_seconds"
+USERS_REGISTERED = "users_registered"
+
+_counters = models.StatCounter.__table__
+
+def add(conn: Connection, deltas: Counter):
+    """Adds `deltas`, a Counter of (name, key) -> increment, to the counters."""
+    rows = [{"name": name, "key": key, "value": delta} for (name, key), delta in deltas.items() if delta]
+    if not rows:
+        return
+
+    if conn.dialect.name == "mysql":
+        statement = mysql_insert(_counters)
+        statement = statement.on_duplicate_key_update(value=_counters.c.value + statement.inserted.value)
+    else:
+        statement = sqlite_insert(_counters)
+        statement = statement.on_conflict_do_update(
+            index_elements=[_counters.c.name, _counters.c.key],
+            set_={"value": _counters.c.value + statement.excluded.value},
+        )
+
+    conn.execute(statement, rows)
+
+def _day(value):
+    return (value.date() if isinstance(value, datetime) else value).isoformat()
+
+def _handover_seconds(request_datetime: datetime, hand_over_datetime: datetime | None):
+    if request_datetime is None or hand_over_datetime is None:
+        return None
+    return int((hand_over_datetime - request_datetime).total_seconds())
+
+def adoption_deltas(request_datetime: datetime, hand_over_datetime: datetime | None, status: str, sign: int = 1):
+    deltas = Counter({(ADOPTIONS, status): sign})
+    seconds = _handover_seconds(request_datetime, hand_over_datetime)
+    if seconds is not None:
+        deltas[HANDOVERS, ""] += sign
+        deltas[HANDOVER_SECONDS, ""] += sign * seconds
+    return deltas
+
+def rebuild(conn: Connection):
+    conn.execute(delete(_counters))
+
+    conn.execute(
+        insert(_counters).from_select(
+            ["name", "key", "value"],
+            select(literal(CATS), literal(""), func.count()).select_from(models.Cat),
+        )
+    )
+    conn.execute(
+        insert(_counters).from_select(
+            ["name", "key", "value"],
+            select(literal(ADOPTIONS), models.Adoption.status, func.count()).group_by(models.Adoption.status),
+        )
+    )
+
+    # The day is formatted in Python: DATE() returns a string on SQLite and a date on MySQL.
+    days = conn.execute(
+        select(func.date(models.User.datetime_register), func.count()).group_by(func.date(models.User.datetime_register))
+    )
+    add(conn, Counter({(USERS_REGISTERED, str(day)): count for day, count in days if day is not None}))
+
+    # Date arithmetic differs per dialect, so hand-over times are summed here.
+    handovers = Counter({(HANDOVERS, ""): 0, (HANDOVER_SECONDS, ""): 0})
+    for request_datetime, hand_over_datetime in conn.execute(
+        select(models.Adoption.request_datetime, models.Adoption.hand_over_datetime)
+        .where(models.Adoption.hand_over_datetime.is_not(None))
+        .execution_options(yield_per=10000)
+    ):
+        seconds = _handover_seconds(request_datetime, hand_over_datetime)
+        if seconds is not None:
+            handovers[HANDOVERS, ""] += 1
+            handovers[HANDOVER_SECONDS, ""] += seconds
+    add(conn, handovers)
+
+    return conn.scalar(select(func.count()).select_from(_counters))
+
+# ORM SYNCHRONIZATION =============================================================================
+
+# Columns whose previous values the counters need when a row changes or is deleted.
+_TRACKED_COLUMNS = {
+    models.Adoption: ("request_datetime", "hand_over_datetime", "status"),
+    models.User: ("datetime_register",),
+}
+
+def previous_value(obj, key: str):
+    """The value `key` had before the flush in progress."""
+    state = inspect(obj)
+    history = state.attrs[key].history
+    if history.deleted:
+        return history.deleted[0]
+    loaded = state.session.info.get("previous_values", {}).get(obj, {})
+    return loaded[key] if key in loaded else getattr(obj, key)
+
+def _adoption_values(obj: models.Adoption, current: bool):
+    value = getattr if current else previous_value
+    return (value(obj, "request_datetime"), value(obj, "hand_over_datetime"), value(obj, "status"))
+
+def _stat_deltas(session: Session):
+    deltas = Counter()
+
+    for obj in session.new:
+        if isinstance(obj, models.Cat):
+            deltas[CATS, ""] += 1
+        elif isinstance(obj, models.Adoption):
+            deltas.update(adoption_deltas(*_adoption_values(obj, current=True)))
+        elif isinstance(obj, models.User) and obj.datetime_register is not None:
+            deltas[USERS_REGISTERED, _day(obj.datetime_register)] += 1
+
+    for obj in (*session.dirty, *session.deleted):
+        deleted = obj in session.deleted
+
+        if isinstance(obj, models.Cat):
+            if deleted:
+                deltas[CATS, ""] -= 1
+
+        elif isinstance(obj, models.Adoption):
+            deltas.update(adoption_deltas(*_adoption_values(obj, current=False), sign=-1))
+            if not deleted:
+                deltas.update(adoption_deltas(*_adoption_values(obj, current=True)))
+
+        elif isinstance(obj, models.User):
+            if (previous := previous_value(obj, "datetime_register")) is not None:
+                deltas[USERS_REGISTERED, _day(previous)] -= 1
+            if not deleted and obj.datetime_register is not None:
+                deltas[USERS_REGISTERED, _day(obj.datetime_register)] += 1
+
+    return deltas
+
+@event.listens_for(Session, "before_flush")
+def _load_previous_values(session: Session, flush_context, instances):
+    """
+    A column assigned while unloaded (left out of its INSERT, or expired) keeps
+    no previous value in its history, and after the flush the row holds the new
+    one, so those previous values are read now. Deleted rows get their unloaded
+    columns loaded while they still exist.
+    """
+    loaded = {}
+    for obj in (*session.dirty, *session.deleted):
+        keys = _TRACKED_COLUMNS.get(type(obj))
+        if keys is None:
+            continue
+        state = inspect(obj)
+
+        if obj in session.deleted:
+            for key in keys:
+                getattr(obj, key)
+            continue
+
+        unknown = [key for key in keys if (history := state.attrs[key].history).added and not history.deleted]
+        if unknown:
+            mapper = state.mapper
+            row = session.connection().execute(
+                select(*(mapper.columns[key] for key in unknown))
+                .where(*(column == value for column, value in zip(mapper.primary_key, state.identity)))
+            ).one()
+            loaded[obj] = dict(zip(unknown, row))
+
+    if loaded:
+        session.info["previous_values"] = loaded
+
+@event.listens_for(Session, "after_flush")
+def _update_counters(session: Session, flush_context):
+    deltas = _stat_deltas(session)
+    if any(deltas.values()):
+        add(session.connection(), deltas)
+
+@event.listens_for(Session, "after_flush_postexec")
+def _discard_previous_values(session: Session, flush_context):
+    session.info.pop("previous_values", None)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manutenção das estatísticas do abrigo.")
+    parser.add_argument("command", choices=["rebuild"])
+    args = parser.parse_args()
+
+    from .database import engine
+    from .migrations import check_schema_version
+
+    with engine.begin() as conn:
+        check_schema_version(conn)
+        print(f"{rebuild(conn)} contadores recalculados.")
@@ -0,0 +1,126 @@
+"""
+Group commit for single-row inserts.
+
+On SQLite every commit takes the database write lock and syncs the journal, so
+concurrent `create_*` requests queue up behind each other (and some give up
+with "database is locked"). When WRITE_BATCHING is on, those inserts are handed
+to one writer task instead. It collects rows until WRITE_BATCH_SIZE are pending
+or WRITE_BATCH_LATENCY_MS has passed since the first one, inserts them all in a
+single transaction, and resolves each caller with its own row (new id included).
+
+Rows go through the ORM, so flush events (search documents, match index,
+caches) still see them. If the batch hits an IntegrityError, each row is retried
+in its own transaction, so only the offending caller gets the error.
+
+Pairs well with SQLITE_JOURNAL_MODE=WAL, which lets reads proceed during the
+batch commit.
+"""
+import asyncio
+import logging
+from os import getenv
+from sqlalchemy.exc import IntegrityError
+from .database import AsyncSessionLocal
+
+WRITE_BATCHING = getenv("WRITE_BATCHING", "0") == "1"
+WRITE_BATCH_SIZE = int(getenv("WRITE_BATCH_SIZE", "100"))
+WRITE_BATCH_LATENCY_MS = float(getenv("WRITE_BATCH_LATENCY_MS", "5"))
+
+logger = logging.getLogger(__name__)
+
+class GroupCommitWriter:
+
+    def __init__(self, session_factory=AsyncSessionLocal, max_batch: int = WRITE_BATCH_SIZE, max_latency_ms: float = WRITE_BATCH_LATENCY_MS):
+        self.session_factory = session_factory
+        self.max_batch = max_batch
+        self.max_latency = max_latency_ms / 1000
+        self.queue: asyncio.Queue | None = None
+        self.task: asyncio.Task | None = None
+
+    @property
+    def running(self):
+        return self.task is not None and not self.task.done()
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Writes whatever is still queued, then stops the writer task."""
+        if not self.running:
+            return
+        await self.queue.put(None)
+        await self.task
+        self.task = None
+
+    async def insert(self, model, values: dict):
+        """Queues one row and waits until the batch holding it is committed."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((model, values, future))
+        return await future
+
+    async def _next_batch(self):
+        first = await self.queue.get()
+        if first is None:
+            return None, True
+
+        batch = [first]
+        deadline = asyncio.get_running_loop().time() + self.max_latency
+
+        while len(batch) < self.max_batch:
+            timeout = deadline - asyncio.get_running_loop().time()
+            try:
+                item = self.queue.get_nowait() if timeout <= 0 else await asyncio.wait_for(self.queue.get(), timeout)
+            except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                break
+            if item is None:
+                return batch, True
+            batch.append(item)
+
+        return batch, False
+
+    async def _run(self):
+        stopping = False
+        while not stopping:
+            batch, stopping = await self._next_batch()
+            if batch:
+                await self._write(batch)
+
+    async def _commit(self, batch):
+        async with self.session_factory() as db:
+            rows = [model(**values) for model, values, _ in batch]
+            db.add_all(rows)
+            await db.commit()
+        return rows
+
+    async def _write(self, batch):
+        try:
+            rows = await self._commit(batch)
+        except IntegrityError:
+            for item in batch:
+                await self._write_alone(item)
+            return
+        except Exception as error:
+            logger.exception("group commit of %d rows failed", len(batch))
+            for _, _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+
+        for row, (_, _, future) in zip(rows, batch):
+            if not future.done():
+                future.set_result(row)
+
+    async def _write_alone(self, item):
+        future = item[2]
+        try:
+            (row,) = await self._commit([item])
+        except Exception as error:
+            if not future.done():
+                future.set_exception(error)
+            return
+
+        if not future.done():
+            future.set_result(row)
+
+
+group_writer = GroupCommitWriter()
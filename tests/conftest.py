@@ -0,0 +1,101 @@
+"""
+Shared fixtures: one synthetic SQLite database (bench.generate) per test run,
+and an in-process client for the API running on it.
+
+core.database reads DATABASE_URL when it is first imported, so the environment
+is set here, before any test module imports core.
+
+Every statement the API issues while serving the client's requests is recorded
+with its route; when the session finishes, the query-plan audit
+(bench.query_plans) plans each distinct shape and fails the run on scans and
+sorts not listed in ALLOWED_SCANS.
+"""
+import os
+import tempfile
+import pytest
+
+_directory = tempfile.mkdtemp(prefix="purrfect-tests-")
+DATABASE_PATH = os.path.join(_directory, "test.db")
+
+os.environ["DATABASE_URL"] = f"sqlite:///{DATABASE_PATH}"
+os.environ.setdefault("JWT_KEY", "test")
+os.environ.setdefault("VACCINATION_REMINDER_INTERVAL_IN_SECONDS", "0")
+
+USERS = 20
+CATS = 200
+
+_recorder = None
+_plan_failures = []
+
+def _record_queries(client):
+    """Labels the statements issued while a request is in flight with its route."""
+    from bench.query_plans import Recorder
+    from core.database import async_engine, async_read_engine
+
+    global _recorder
+    _recorder = Recorder(client.app)
+
+    def request_started(request):
+        _recorder.endpoint = _recorder.route(request.method, request.url.path)
+
+    def request_finished(response):
+        _recorder.endpoint = None
+
+    client.event_hooks = {"request": [request_started], "response": [request_finished]}
+    _recorder.listen({async_engine.sync_engine, async_read_engine.sync_engine})
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+    from bench.generate import generate
+    from core.main import app
+
+    generate(DATABASE_PATH, USERS, CATS, messages=50)
+    with TestClient(app) as client:
+        _record_queries(client)
+        yield client
+
+def pytest_sessionfinish(session):
+    if _recorder is None or not _recorder.recorded:
+        return
+
+    from sqlalchemy import inspect
+    from bench.query_plans import SMALL_TABLES, audit, describe_failure
+    from core.database import engine
+
+    with engine.connect() as conn:
+        queries, failures = audit(conn, _recorder.recorded, set(inspect(conn).get_table_names()) - SMALL_TABLES)
+    if failures:
+        _plan_failures.extend(describe_failure(query) for query in queries if query["failed"])
+        session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+def pytest_terminal_summary(terminalreporter):
+    if _plan_failures:
+        terminalreporter.section("query plans")
+        for failure in _plan_failures:
+            terminalreporter.write_line(failure)
+
+@pytest.fixture
+def statements():
+    """SQL statements the API sends to the database while the test runs."""
+    from sqlalchemy import event
+    from core.database import async_engine, async_read_engine
+
+    recorded = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        recorded.append(statement)
+
+    engines = {async_engine.sync_engine, async_read_engine.sync_engine}
+    for engine in engines:
+        event.listen(engine, "before_cursor_execute", record)
+    yield recorded
+    for engine in engines:
+        event.remove(engine, "before_cursor_execute", record)
+
+@pytest.fixture(scope="session")
+def auth(client):
+    from bench.generate import BENCH_PASSWORD
+
+    token = client.post("/auth", data={"username": "user1", "password": BENCH_PASSWORD}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
@@ -0,0 +1,50 @@
+import warnings
+from datetime import datetime
+from sqlalchemy import func, select
+from bench.generate import BENCH_PASSWORD
+from core import models
+from core.database import AsyncSessionLocal
+
+def _login(client, username: str):
+    token = client.post("/auth", data={"username": username, "password": BENCH_PASSWORD}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+def test_cat_has_one_active_adoption(client, auth):
+    cat_id = client.post("/cat", json={"name": "Adotável", "age": 1, "sex": "M"}).json()["id"]
+
+    response = client.post("/adoptions", headers=auth, json={"cat_id": cat_id})
+
+    assert response.status_code == 201
+    assert response.json()["user_id"] == 1
+    assert response.json()["status"] == models.ADOPTION_STATUS_PENDING
+
+    second = client.post("/adoptions", headers=_login(client, "user2"), json={"cat_id": cat_id})
+
+    assert second.status_code == 409
+
+def test_adopting_a_missing_cat(client, auth):
+    response = client.post("/adoptions", headers=auth, json={"cat_id": 10**6})
+
+    assert response.status_code == 404
+
+def test_deleting_a_cat_removes_its_adoption_history(client):
+    async def adopt_cancel_adopt_delete():
+        async with AsyncSessionLocal() as db:
+            cat = models.Cat(name="Readotado", age=3, sex="F")
+            db.add(cat)
+            await db.flush()
+            db.add_all([
+                models.Adoption(user_id=2, cat_id=cat.id, request_datetime=datetime(2024, 9, 1), status="cancelada"),
+                models.Adoption(user_id=1, cat_id=cat.id, request_datetime=datetime(2024, 9, 2), status=models.ADOPTION_STATUS_PENDING),
+            ])
+            await db.commit()
+
+            await db.refresh(cat, ["adoptions"])
+            assert len(cat.adoptions) == 2
+            await db.delete(cat)
+            await db.commit()
+            return await db.scalar(select(func.count()).select_from(models.Adoption).where(models.Adoption.cat_id == cat.id))
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        assert client.portal.call(adopt_cancel_adopt_delete) == 0
@@ -0,0 +1,34 @@
+from bench.generate import BENCH_PASSWORD
+from core import security
+
+def _count_kdf_runs(monkeypatch):
+    runs = []
+    kdf_hash = security._kdf_hash
+
+    def counting(*args):
+        runs.append(args[0])
+        return kdf_hash(*args)
+
+    monkeypatch.setattr(security, "_kdf_hash", counting)
+    return runs
+
+def test_login(client):
+    response = client.post("/auth", data={"username": "user1", "password": BENCH_PASSWORD})
+
+    assert response.status_code == 200
+    assert response.json()["token_type"] == "bearer"
+
+def test_unknown_username_costs_a_password_check(client, monkeypatch):
+    security._dummy_credentials()
+    runs = _count_kdf_runs(monkeypatch)
+
+    unknown = client.post("/auth", data={"username": "nobody", "password": "wrong"})
+    assert unknown.status_code == 401
+    unknown_runs = len(runs)
+
+    runs.clear()
+    wrong = client.post("/auth", data={"username": "user1", "password": "wrong"})
+    assert wrong.status_code == 401
+
+    assert unknown_runs == len(runs) == 1
+    assert unknown.json() == wrong.json()
@@ -0,0 +1,19 @@
+import pytest
+
+# The cats joined to their one-to-one rows, then one SELECT ... IN per collection
+# (colors, personalities, diseases, vaccinations).
+PROFILE_PAGE_QUERIES = 5
+
+@pytest.mark.parametrize("limit", [1, 50, 100])
+def test_profile_page_query_count_does_not_grow_with_page_size(client, statements, limit):
+    response = client.get("/cats/profiles", params={"limit": limit})
+
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == limit
+    assert len(statements) == PROFILE_PAGE_QUERIES
+
+def test_profile_pages_load_every_collection(client):
+    items = client.get("/cats/profiles", params={"limit": 100}).json()["items"]
+
+    for collection in ("colors", "personalities", "vaccinations"):
+        assert any(item[collection] for item in items), collection
@@ -0,0 +1,26 @@
+def _pages(client, params):
+    cats, cursor = [], None
+    while True:
+        page = client.get("/cats", params={**params, "limit": 7, **({"cursor": cursor} if cursor else {})}).json()
+        cats += page["items"]
+        if (cursor := page["next_cursor"]) is None:
+            return cats
+
+def test_age_range_pages_follow_the_id_order(client):
+    cats = _pages(client, {"min_age": 3, "max_age": 8})
+
+    assert [cat["id"] for cat in cats] == [cat["id"] for cat in _pages(client, {}) if 3 <= cat["age"] <= 8]
+
+def test_single_age_pages_follow_the_id_order(client):
+    cats = _pages(client, {"min_age": 5, "max_age": 5})
+
+    assert cats
+    assert [cat["id"] for cat in cats] == [cat["id"] for cat in _pages(client, {}) if cat["age"] == 5]
+
+def test_duplicate_name_is_rejected(client):
+    cat = {"name": "Único", "age": 1, "sex": "F"}
+    assert client.post("/cat", json=cat).status_code == 200
+
+    response = client.post("/cat", json=cat)
+
+    assert response.status_code == 400
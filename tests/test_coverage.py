@@ -0,0 +1,22 @@
+import pytest
+
+def test_coverage_pages_with_its_cursor(client, auth):
+    first = client.get("/vaccinations/coverage", params={"as_of": "2024-09-01", "limit": 1}, headers=auth).json()
+    assert first["next_cursor"] is not None
+
+    second = client.get(
+        "/vaccinations/coverage", params={"as_of": "2024-09-01", "limit": 1, "cursor": first["next_cursor"]}, headers=auth,
+    )
+
+    assert second.status_code == 200
+    assert second.json()["uncovered"] != first["uncovered"]
+
+@pytest.mark.parametrize("cursor, status", [
+    ("garbage", 422),
+    ("1_" + "9" * 25, 422),
+    ("1_" + "9" * 19, 400),
+])
+def test_malformed_cursor_is_a_client_error(client, auth, cursor, status):
+    response = client.get("/vaccinations/coverage", params={"cursor": cursor}, headers=auth)
+
+    assert response.status_code == status
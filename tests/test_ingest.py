@@ -0,0 +1,56 @@
+import json
+from itertools import count
+from sqlalchemy import insert
+from core import ingest, models
+
+_names = count()
+
+def _cat(**fields):
+    return {"name": f"Importado {next(_names)}", "age": 2, "sex": "F", "colors": [1], "personalities": [1], **fields}
+
+def _import(client, cats):
+    response = client.post("/cats/import", content="\n".join(json.dumps(cat) for cat in cats))
+    assert response.status_code == 200
+    return response.json()
+
+def test_repeated_vaccine_is_a_row_error(client):
+    vaccination = {"vaccine_id": 1, "dose": "1", "appl_date": "2024-01-01"}
+    cats = [_cat(), _cat(vaccinations=[vaccination, vaccination]), _cat()]
+
+    result = _import(client, cats)
+
+    assert result["created"] == 2
+    assert result["errors"] == [{"row": 2, "error": "Vacinas repetidas: 1"}]
+
+def test_existing_and_repeated_names_are_skipped(client):
+    existing = _cat()
+    assert _import(client, [existing])["created"] == 1
+    cats = [_cat(), _cat(name=existing["name"]), _cat(), _cat()]
+    cats[3]["name"] = cats[2]["name"]
+
+    result = _import(client, cats)
+
+    assert result["created"] == 2
+    assert result["errors"] == [
+        {"row": 2, "error": ingest.DUPLICATE_NAME_ERROR},
+        {"row": 4, "error": ingest.DUPLICATE_NAME_ERROR},
+    ]
+
+def test_database_error_only_fails_its_row(client, monkeypatch):
+    write_chunk = ingest._write_chunk
+
+    async def failing(db, cats):
+        if any(cat.name == "Rejeitado" for cat in cats):
+            await db.execute(insert(models.Cat.__table__), [{"name": None, "age": 1, "sex": "F"}])
+        return await write_chunk(db, cats)
+
+    monkeypatch.setattr(ingest, "_write_chunk", failing)
+    cats = [_cat() for _ in range(5)]
+    cats[3]["name"] = "Rejeitado"
+
+    result = _import(client, cats)
+
+    assert result["created"] == 4
+    assert [error["row"] for error in result["errors"]] == [4]
+    assert len(result["errors"][0]["error"]) <= ingest.ERROR_MAX_LENGTH
+    assert "INSERT" not in result["errors"][0]["error"]
@@ -0,0 +1,26 @@
+import pytest
+
+def test_conversation_pages_with_its_cursor(client, auth):
+    for content in ("primeira", "segunda"):
+        assert client.post("/messages", json={"receiver_id": 2, "content": content}, headers=auth).status_code == 200
+
+    first = client.get("/messages/conversations/2", params={"limit": 1}, headers=auth).json()
+    assert first["next_cursor"] is not None
+
+    second = client.get("/messages/conversations/2", params={"limit": 1, "cursor": first["next_cursor"]}, headers=auth)
+
+    assert second.status_code == 200
+    assert second.json()["items"] != first["items"]
+
+@pytest.mark.parametrize("path", ["/messages/inbox", "/messages/conversations/2"])
+@pytest.mark.parametrize("cursor, status", [
+    ("garbage", 422),
+    ("bad_x", 422),
+    ("2024-13-45T00:00:00_1", 400),
+    ("2024-01-01T00:00:00_" + "9" * 25, 422),
+    ("2024-01-01T00:00:00_" + "9" * 19, 400),
+])
+def test_malformed_cursor_is_a_client_error(client, auth, path, cursor, status):
+    response = client.get(path, params={"cursor": cursor}, headers=auth)
+
+    assert response.status_code == status
@@ -0,0 +1,55 @@
+import asyncio
+import random
+
+USER_ID = 3
+
+def _stored_preferences(client, user_id):
+    from sqlalchemy import select
+    from core import models
+    from core.database import AsyncSessionLocal
+
+    async def read():
+        async with AsyncSessionLocal() as db:
+            colors = await db.scalars(select(models.ColorPreference.color_id).where(models.ColorPreference.user_id == user_id))
+            personalities = await db.scalars(
+                select(models.PersonalityPreference.personality_id).where(models.PersonalityPreference.user_id == user_id)
+            )
+            return set(colors), set(personalities)
+
+    return client.portal.call(read)
+
+def test_replace_writes_exactly_the_requested_sets(client, auth):
+    for preferences in ({"colors": [1, 2, 3], "personalities": [1]}, {"colors": [3, 4], "personalities": []}):
+        response = client.put("/user/me/preferences", headers=auth, json=preferences)
+
+        assert response.status_code == 200
+        assert response.json() == preferences
+        assert _stored_preferences(client, 1) == (set(preferences["colors"]), set(preferences["personalities"]))
+
+def test_unknown_id_is_rejected(client, auth):
+    response = client.put("/user/me/preferences", headers=auth, json={"colors": [1, 10_000], "personalities": []})
+
+    assert response.status_code == 400
+
+def test_concurrent_replaces_leave_one_of_the_requested_sets(client):
+    from core import crud, matching, schemas
+    from core.database import AsyncSessionLocal
+
+    rng = random.Random(25)
+    requested = [
+        schemas.Preferences(colors=rng.sample(range(1, 11), 3), personalities=rng.sample(range(1, 9), 2))
+        for _ in range(20)
+    ]
+
+    async def replace(preferences):
+        async with AsyncSessionLocal() as db:
+            await crud.replace_preferences(db, USER_ID, preferences)
+
+    async def replace_all():
+        await asyncio.gather(*(replace(preferences) for preferences in requested))
+
+    client.portal.call(replace_all)
+
+    stored = _stored_preferences(client, USER_ID)
+    assert stored in [(set(preferences.colors), set(preferences.personalities)) for preferences in requested]
+    assert matching.index._user_preferences(USER_ID) == stored
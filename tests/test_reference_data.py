@@ -0,0 +1,26 @@
+from time import time
+from sqlalchemy import insert
+from core import cache, models
+from core.database import engine
+
+def test_colors_revalidate_after_an_outside_change(client, monkeypatch):
+    first = client.get("/colors")
+    etag = first.headers["ETag"]
+
+    assert first.status_code == 200
+    assert client.get("/colors", headers={"If-None-Match": etag}).status_code == 304
+
+    # A write this process never sees, as from another worker or a script.
+    with engine.begin() as conn:
+        conn.execute(insert(models.Color.__table__).values(name="lilás"))
+
+    assert client.get("/colors", headers={"If-None-Match": etag}).status_code == 304
+
+    now = time() + cache.reference_cache.ttl
+    monkeypatch.setattr(cache, "time", lambda: now)
+    changed = client.get("/colors", headers={"If-None-Match": etag})
+
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] != etag
+    assert "lilás" in [color["name"] for color in changed.json()]
+    assert client.get("/colors", headers={"If-None-Match": changed.headers["ETag"]}).status_code == 304
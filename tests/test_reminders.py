@@ -0,0 +1,67 @@
+from datetime import date, datetime, timedelta
+import pytest
+from sqlalchemy import select
+from core import models, reminders
+from core.database import AsyncSessionLocal
+
+TODAY = date(2024, 9, 1)
+OVERDUE = TODAY - timedelta(days=400)
+DUE = TODAY + timedelta(days=3)
+
+def _run_once(client, today: date):
+    async def run():
+        async with AsyncSessionLocal() as db:
+            return await reminders.run_once(db, today)
+
+    return client.portal.call(run)
+
+def _adopted_cat_with_doses(client, name: str, next_dates: list[date]):
+    async def create():
+        async with AsyncSessionLocal() as db:
+            cat = models.Cat(name=name, age=3, sex="M")
+            db.add(cat)
+            await db.flush()
+            db.add(models.Adoption(
+                user_id=1, cat_id=cat.id, request_datetime=datetime(2024, 1, 1),
+                hand_over_datetime=datetime(2024, 1, 5), status=models.ADOPTION_STATUS_COMPLETED,
+            ))
+            db.add_all(
+                models.Vaccination(cat_id=cat.id, vaccine_id=vaccine_id, dose="1", appl_date=date(2023, 1, 1), next_date=next_date)
+                for vaccine_id, next_date in enumerate(next_dates, 1)
+            )
+            await db.commit()
+
+    client.portal.call(create)
+
+def _reminders_received(client, user_id: int):
+    async def read():
+        async with AsyncSessionLocal() as db:
+            sender_id = await db.scalar(select(models.User.id).where(models.User.role == reminders.SYSTEM_ROLE))
+            return (await db.scalars(
+                select(models.Message.content).where(models.Message.sender_id == sender_id, models.Message.receiver_id == user_id)
+            )).all()
+
+    return client.portal.call(read)
+
+@pytest.mark.parametrize("username, role", [(reminders.REMINDER_SENDER_USERNAME, "user"), ("impostor", reminders.SYSTEM_ROLE)])
+def test_system_sender_cannot_be_registered(client, username, role):
+    response = client.post("/user", json={
+        "name": "Impostor", "username": username, "date_birth": "2000-01-01",
+        "datetime_register": datetime.now().isoformat(), "role": role, "contact_email": None,
+        "contact_phone": "11999999999", "password": "senha",
+    })
+
+    assert response.status_code == 400
+
+def test_first_pass_skips_doses_overdue_before_it(client):
+    _adopted_cat_with_doses(client, "Lembrado", [OVERDUE, DUE])
+
+    assert _run_once(client, TODAY) > 0
+
+    content = "\n".join(_reminders_received(client, 1))
+    assert "Lembrado: " in content
+    assert DUE.strftime("%d/%m/%Y") in content
+    assert OVERDUE.strftime("%d/%m/%Y") not in content
+
+    # The watermark now covers the window: a second pass on the same day sends nothing.
+    assert _run_once(client, TODAY) == 0
@@ -0,0 +1,50 @@
+import pytest
+
+RESCUE = {
+    "description": "Gato preso no telhado", "addr_city": "Campinas", "addr_state": "São Paulo",
+    "addr_street": "Rua das Flores", "addr_number": 10, "addr_zipcode": "13010000",
+}
+
+def test_open_rescues_page_with_their_cursor(client, auth):
+    for _ in range(2):
+        assert client.post("/rescues", json=RESCUE, headers=auth).status_code == 200
+
+    first = client.get("/rescues/open", params={"city": "Campinas", "limit": 1}).json()
+    assert first["next_cursor"] is not None
+
+    second = client.get("/rescues/open", params={"city": "Campinas", "limit": 1, "cursor": first["next_cursor"]})
+
+    assert second.status_code == 200
+    assert second.json()["items"] != first["items"]
+
+def _all_pages(client, params):
+    rescues, cursor = [], None
+    while True:
+        page = client.get("/rescues/open", params={**params, "limit": 2, **({"cursor": cursor} if cursor else {})}).json()
+        rescues += page["items"]
+        if (cursor := page["next_cursor"]) is None:
+            return rescues
+
+@pytest.mark.parametrize("zipcode_prefix", ["1301", "13010000"])
+def test_zipcode_pages_are_in_queue_order(client, auth, zipcode_prefix):
+    for _ in range(3):
+        assert client.post("/rescues", json=RESCUE, headers=auth).status_code == 200
+
+    rescues = _all_pages(client, {"zipcode_prefix": zipcode_prefix})
+
+    assert len(rescues) >= 3
+    assert all(rescue["addr_zipcode"].startswith(zipcode_prefix) for rescue in rescues)
+    keys = [(rescue["request_datetime"], rescue["user_id"]) for rescue in rescues]
+    assert keys == sorted(keys)
+
+@pytest.mark.parametrize("cursor, status", [
+    ("garbage", 422),
+    ("2024-01-01T00:00:00_x", 422),
+    ("2024-02-30T00:00:00_1", 400),
+    ("2024-01-01T00:00:00_" + "9" * 25, 422),
+    ("2024-01-01T00:00:00_" + "9" * 19, 400),
+])
+def test_malformed_cursor_is_a_client_error(client, cursor, status):
+    response = client.get("/rescues/open", params={"city": "X", "cursor": cursor})
+
+    assert response.status_code == status
@@ -0,0 +1,27 @@
+from datetime import datetime
+import pytest
+from bench.generate import BENCH_PASSWORD
+
+STAFF_ONLY = ["/export/adoptions", "/export/rescues?format=csv", "/stats", "/vaccinations/coverage", "/vaccinations/coverage/export"]
+
+@pytest.fixture(scope="module")
+def user_auth(client):
+    token = client.post("/auth", data={"username": "user2", "password": BENCH_PASSWORD}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+@pytest.mark.parametrize("url", STAFF_ONLY)
+def test_staff_only_endpoints_reject_other_users(client, user_auth, url):
+    assert client.get(url, headers=user_auth).status_code == 403
+
+@pytest.mark.parametrize("url", STAFF_ONLY)
+def test_staff_reach_staff_only_endpoints(client, auth, url):
+    assert client.get(url, headers=auth).status_code == 200
+
+def test_staff_role_cannot_be_registered(client):
+    response = client.post("/user", json={
+        "name": "Intrusa", "username": "intrusa", "date_birth": "2000-01-01",
+        "datetime_register": datetime.now().isoformat(), "role": "admin", "contact_email": None,
+        "contact_phone": "11999999999", "password": "senha",
+    })
+
+    assert response.status_code == 400
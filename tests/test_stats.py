@@ -0,0 +1,70 @@
+from datetime import date, datetime
+from sqlalchemy import select
+from core import models, stats
+from core.database import AsyncSessionLocal, engine
+
+def _counters(conn):
+    return {
+        (name, key): value
+        for name, key, value in conn.execute(select(models.StatCounter.name, models.StatCounter.key, models.StatCounter.value))
+        if value
+    }
+
+def _assert_counters_match_rebuild():
+    with engine.connect() as conn:
+        stored = _counters(conn)
+        stats.rebuild(conn)
+        rebuilt = _counters(conn)
+        conn.rollback()
+
+    assert stored == rebuilt
+
+def _user(username: str, registered: datetime):
+    return models.User(
+        name="Estatística", username=username, date_birth=date(2000, 1, 1), datetime_register=registered,
+        pass_salt="", pass_hash="", role="user", contact_email=None, contact_phone="11999999999",
+    )
+
+def test_counters_follow_orm_writes(client):
+    async def write():
+        async with AsyncSessionLocal() as db:
+            kept, moved = _user("stats_kept", datetime(2024, 8, 1, 10)), _user("stats_moved", datetime(2024, 8, 2, 23))
+            cat, gone = models.Cat(name="Contado", age=2, sex="F"), models.Cat(name="Descontado", age=4, sex="M")
+            db.add_all([kept, moved, cat, gone])
+            await db.flush()
+            adoption = models.Adoption(
+                user_id=kept.id, cat_id=cat.id, request_datetime=datetime(2024, 8, 3), status=models.ADOPTION_STATUS_PENDING,
+            )
+            db.add_all([adoption, models.Adoption(
+                user_id=moved.id, cat_id=gone.id, request_datetime=datetime(2024, 8, 3),
+                hand_over_datetime=datetime(2024, 8, 10), status=models.ADOPTION_STATUS_COMPLETED,
+            )])
+            await db.commit()
+            _assert_counters_match_rebuild()
+
+            adoption.status = models.ADOPTION_STATUS_COMPLETED
+            adoption.hand_over_datetime = datetime(2024, 8, 4, 12)
+            moved.datetime_register = datetime(2024, 8, 5)
+            await db.commit()
+            _assert_counters_match_rebuild()
+
+            adoption.status = "cancelada"
+            await db.delete(gone)
+            await db.delete(moved)
+            await db.commit()
+            _assert_counters_match_rebuild()
+
+            await db.delete(adoption)
+            await db.delete(cat)
+            await db.delete(kept)
+            await db.commit()
+
+    client.portal.call(write)
+
+    _assert_counters_match_rebuild()
+
+def test_counters_follow_api_writes(client, auth):
+    cat_id = client.post("/cat", json={"name": "Contado pela API", "age": 1, "sex": "F"}).json()["id"]
+    assert client.post("/adoptions", headers=auth, json={"cat_id": cat_id}).status_code == 201
+
+    _assert_counters_match_rebuild()
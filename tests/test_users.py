@@ -0,0 +1,13 @@
+from datetime import datetime
+
+def test_duplicate_username_is_rejected(client):
+    user = {
+        "name": "Repetido", "username": "repetido", "date_birth": "2000-01-01",
+        "datetime_register": datetime.now().isoformat(), "role": "user", "contact_email": None,
+        "contact_phone": "11999999999", "password": "senha",
+    }
+    assert client.post("/user", json=user).status_code == 200
+
+    response = client.post("/user", json=user)
+
+    assert response.status_code == 400
@@ -0,0 +1,49 @@
+import asyncio
+import httpx
+from core import models
+from core.writer import group_writer
+
+def test_duplicate_in_a_batch_only_fails_its_caller(client, monkeypatch):
+    batch_sizes = []
+    commit = group_writer._commit
+
+    async def recording_commit(batch):
+        batch_sizes.append(len(batch))
+        return await commit(batch)
+
+    monkeypatch.setattr(group_writer, "_commit", recording_commit)
+    cats = [{"name": f"Em lote {i}", "age": 1, "sex": "F"} for i in range(49)]
+    cats.append(dict(cats[10]))
+
+    async def post_all():
+        group_writer.start()
+        try:
+            transport = httpx.ASGITransport(app=client.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+                return await asyncio.gather(*(http.post("/cat", json=cat) for cat in cats))
+        finally:
+            await group_writer.stop()
+
+    responses = client.portal.call(post_all)
+
+    assert max(batch_sizes) > 1
+    assert sorted(response.status_code for response in responses) == [200] * 49 + [400]
+    assert len({response.json()["id"] for response in responses if response.status_code == 200}) == 49
+
+def test_stop_writes_the_queued_rows(client):
+    async def stop_with_rows_queued():
+        group_writer.start()
+        inserts = [
+            asyncio.create_task(group_writer.insert(models.Cat, {"name": f"Na fila {i}", "age": 2, "sex": "M"}))
+            for i in range(10)
+        ]
+        # Let every insert reach the queue before the stop marker.
+        await asyncio.sleep(0)
+        await group_writer.stop()
+        return await asyncio.gather(*inserts)
+
+    rows = client.portal.call(stop_with_rows_queued)
+
+    assert not group_writer.running
+    assert all(row.id is not None for row in rows)
+    assert client.get("/cat", params={"id": rows[-1].id}).json()["name"] == "Na fila 9"